@@ -0,0 +1,82 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+from collections import OrderedDict
+
+def fileHash(fname):
+    """SHA-1 of a file's content"""
+    h = hashlib.sha1()
+    with open(fname, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+def paramsHash(params):
+    """SHA-1 of a dict of parameters, with arrays hashed by value"""
+    h = hashlib.sha1()
+    for name in sorted(params):
+        value = params[name]
+        h.update(name.encode())
+        if isinstance(value, np.ndarray):
+            h.update(np.ascontiguousarray(value, dtype=np.float64).tobytes())
+        else:
+            h.update(repr(value).encode())
+    return h.hexdigest()
+
+class ResultCache:
+    """
+    Persistent, size-bounded cache of per-image results (e.g. detections or chessboard corners),
+    keyed by image file content plus the parameters that produced the result. Entries are
+    JSON-serializable dicts; the least recently used entries are evicted beyond maxEntries.
+    Safe to use from worker threads.
+    """
+    def __init__(self, path, maxEntries=5000):
+        self.path = path
+        self.maxEntries = maxEntries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if os.path.isfile(path):
+            try:
+                with open(path) as f:
+                    self.entries = OrderedDict(json.load(f))
+            except (OSError, ValueError):
+                print(f"Could not read cache {path}, starting empty")
+
+    def key(self, fname, params):
+        """Cache key of an image file for a dict of parameters"""
+        return f"{fileHash(fname)}-{paramsHash(params)}"
+
+    def get(self, key):
+        """Returns the cached entry for key, or None"""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+                self.entries.move_to_end(key)
+            return entry
+
+    def put(self, key, entry):
+        """Stores an entry, evicting the least recently used entries if the cache is full"""
+        with self.lock:
+            self.entries[key] = entry
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxEntries:
+                self.entries.popitem(last=False)
+
+    def save(self):
+        """Writes the cache to disk"""
+        with self.lock:
+            try:
+                tmp = f"{self.path}.tmp"
+                with open(tmp, 'w') as f:
+                    json.dump(self.entries, f)
+                os.replace(tmp, self.path)
+            except OSError:
+                print(f"Could not write cache {self.path}")
@@ -1,74 +1,978 @@
+import os
+import inspect
+import functools
 import numpy as np
 import cv2
+import Undistortion
+import CalibrationCache
 
-def hand_eye_p2l(X, Q, A, tol=0.001):
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+def hand_eye_p2l(X, Q, A, tol=0.001, maxIter=1000, init=None, returnInfo=False):
     """
     Based on: https://github.com/TaraKemper/VideoBasedHandEye/blob/main/HandEyeCalibration.py
     Arguments:  X (3xn):    3D coordinates, tracker space
                 Q (2xn):    2D pixel locations, image space
                 A (3x3):    camera matrix
+                tol:        convergence threshold on the change in registration residuals
+                maxIter:    maximum number of iterations, at least 1
+                init:       optional (R, t) to warm-start the iteration from, e.g. a previous solution
+                returnInfo: if True, also return a dict of solver diagnostics
 
     Returns:    R (3x3):    orthonormal rotation matrix
                 t (3x1):    translation
+                info:       (only if returnInfo) dict with "iterations", "converged" and "err"
+
+    The iteration converges linearly: from a cold start it takes some 400-600 iterations whatever
+    the number of points (about 20 ms for tens of points, 0.15-0.2 s for 10k points), since tol
+    applies to the residuals of all points together. A warm start from a nearby solution needs only
+    a handful.
     """
+    if maxIter < 1:
+        raise ValueError(f"hand_eye_p2l needs at least one iteration, got maxIter={maxIter}")
+    X = np.asarray(X, dtype=float)
     n = Q.shape[1]
-    e = np.ones(n)
-    J = np.identity(n) - (np.divide((np.transpose(e) * e), n))
-    Q = np.linalg.inv(A) @ np.vstack((Q, e))
-    Y = ([[], [], []])
 
-    # Normalizing the 2D pixel coordinates
-    for i in range(n):
-        x = Q[:, i]
-        y = np.linalg.norm(x)
-        z = x / y
-        z = np.reshape(z, (3, 1))
-        Y = np.hstack((Y, z))
+    # Normalizing the 2D pixel coordinates into unit lines of sight
+    Q = np.linalg.inv(A) @ np.vstack((Q, np.ones(n)))
+    Q = Q / np.linalg.norm(Q, axis=0)
+    if init is None:
+        Y = Q
+    else:
+        # Warm start: points of the initial registration projected onto the lines of sight
+        R0, t0 = init
+        Y = np.einsum('ij,ij->j', R0 @ X + t0, Q) * Q
+
+    # Centering X once replaces the n x n centering matrix J (Y @ J @ X.T == Y @ Xc.T)
+    Xc = X - X.mean(axis=1, keepdims=True)
 
-    Q = Y
     err = np.inf
     E_old = 1000 * np.ones((3, n))
-
-    while err > tol:
-        a = Y @ J @ X.T.conj()
+    iterations = 0
+    while err > tol and iterations < maxIter:
+        a = Y @ Xc.T
         U, S, V, = np.linalg.svd(a)
 
         # Get rotation
-        R = U @ np.array([[1, 0, 0], [0, 1, 0], [0, 0, np.linalg.det(U @ V)]]) @ V 
+        R = U @ np.diag([1, 1, np.linalg.det(U @ V)]) @ V
 
         # Get translation
-        T = Y - R @ X
-        t = ([])
-        for i in range(np.shape(Y)[0]): # could use n?
-            t = np.append(t, np.mean(T[i]))
-        t = np.reshape(t, (np.shape(Y)[0], 1))
-
-        # Reprojection
-        h = R @ X + t * e
-        H = ([])
-        for i in range(np.shape(Q)[1]):
-            H = np.append(H, np.dot(h[:, i], Q[:, i]))
-        Y = np.matlib.repmat(H, 3, 1) * Q
+        RX = R @ X
+        t = np.mean(Y - RX, axis=1, keepdims=True)
+
+        # Reprojection onto the lines of sight
+        h = RX + t
+        Y = np.einsum('ij,ij->j', h, Q) * Q
 
         # Get reprojection error
-        E = Y - R @ X - t * e
+        E = Y - h
         err = np.linalg.norm(E - E_old, 'fro')
         E_old = E
-    
+        iterations += 1
+
+    if returnInfo:
+        return R, t, {"iterations": iterations, "converged": bool(err <= tol), "err": float(err)}
     return R, t
-def analyzeFrames(frames, transforms, intMtx, distCoeffs):
+
+def hand_eye_p2l_batch(X, Q, A, mask=None, tol=0.001, maxIter=1000, init=None):
+    """
+    Solves a stack of independent point-to-line registrations at once, with the same
+    iteration as hand_eye_p2l but using stacked SVDs. Problems of different sizes are
+    zero-padded to a common n and described by mask.
+
+    Arguments:  X (mx3xn):      3D coordinates, tracker space
+                Q (mx2xn):      2D pixel locations, image space
+                A (3x3 or mx3x3):   camera matrix, shared or per problem
+                mask (mxn):     boolean array of valid (non-padding) points, all valid if None
+                tol:            convergence threshold on the change in registration residuals
+                maxIter:        maximum number of iterations
+                init:           optional (R (3x3 or mx3x3), t (3x1 or mx3x1)) to warm-start every problem from
+
+    Returns:    R (mx3x3):      orthonormal rotation matrices
+                t (mx3x1):      translations
+                converged (m,): whether each problem reached tol within maxIter
+                iterations (m,):    number of iterations run for each problem
+    """
+    X = np.asarray(X, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    m, _, n = X.shape
+    if mask is None:
+        w = np.ones((m, 1, n))
+    else:
+        w = np.asarray(mask, dtype=float)[:, None, :]
+    count = w.sum(axis=2, keepdims=True)
+
+    # Normalizing the 2D pixel coordinates into unit lines of sight
+    Q = np.linalg.inv(A) @ np.concatenate((Q, np.ones((m, 1, n))), axis=1)
+    Q = Q / np.linalg.norm(Q, axis=1, keepdims=True)
+    if init is None:
+        Y = Q
+    else:
+        # Warm start: points of the initial registrations projected onto the lines of sight
+        R0, t0 = init
+        Y = ((R0 @ X + t0) * Q).sum(axis=1, keepdims=True) * Q
+
+    # Centred X with padding zeroed, so padded points drop out of every sum
+    Xc = (X - (X * w).sum(axis=2, keepdims=True) / count) * w
+
+    R = np.tile(np.eye(3), (m, 1, 1))
+    t = np.zeros((m, 3, 1))
+    E_old = 1000 * np.ones((m, 3, n))
+    err = np.full(m, np.inf)
+    iterations = np.zeros(m, dtype=int)
+    for _ in range(maxIter):
+        active = err > tol
+        if not active.any():
+            break
+
+        a = Y @ Xc.transpose(0, 2, 1)
+        U, S, V = np.linalg.svd(a)
+
+        # Get rotations
+        D = np.ones((m, 3))
+        D[:, 2] = np.linalg.det(U @ V)
+        R_new = (U * D[:, None, :]) @ V
+
+        # Get translations
+        RX = R_new @ X
+        t_new = ((Y - RX) * w).sum(axis=2, keepdims=True) / count
+
+        # Reprojection onto the lines of sight
+        h = RX + t_new
+        Y_new = (h * Q).sum(axis=1, keepdims=True) * Q
+
+        # Get reprojection error
+        E = (Y_new - h) * w
+        err_new = np.linalg.norm(E - E_old, axis=(1, 2))
+
+        # Converged problems keep the solution from the iteration they converged on
+        sel = active[:, None, None]
+        R = np.where(sel, R_new, R)
+        t = np.where(sel, t_new, t)
+        Y = np.where(sel, Y_new, Y)
+        E_old = np.where(sel, E, E_old)
+        err = np.where(active, err_new, err)
+        iterations += active
+
+    return R, t, err <= tol, iterations
+
+def reprojectionErrors(R, t, X, Q, A):
+    """
+    Pixel reprojection error of 3D points under one or a stack of hypotheses
+
+    Arguments:  R (3x3 or hx3x3):   rotation(s), tracker to camera
+                t (3x1 or hx3x1):   translation(s)
+                X (3xn):            3D coordinates, tracker space
+                Q (2xn):            2D pixel locations, image space
+                A (3x3):            camera matrix
+
+    Returns:    errs (n, or hxn):   pixel errors, inf for points behind the camera
+    """
+    P = (A @ R) @ X + A @ t
+    z = P[..., 2, :]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        dx = P[..., 0, :] / z - Q[0]
+        dy = P[..., 1, :] / z - Q[1]
+        errs = np.sqrt(dx * dx + dy * dy)
+    return np.where(z > 0, errs, np.inf)
+
+def hand_eye_p2l_ransac(X, Q, A, threshold=5.0, maxHypotheses=1000, confidence=0.99, batchSize=100,
+                        seed=None, tol=0.001, maxIter=1000):
+    """
+    Outlier-robust point-to-line registration (MSAC). Hypotheses are solved from minimal
+    4-point subsets and every point is scored against a whole batch of hypotheses in one
+    reprojection pass; the best hypothesis is then refined with hand_eye_p2l on its inliers.
+
+    Arguments:  X (3xn):        3D coordinates, tracker space
+                Q (2xn):        2D pixel locations, image space
+                A (3x3):        camera matrix
+                threshold:      inlier threshold on pixel reprojection error
+                maxHypotheses:  maximum number of hypotheses to draw
+                confidence:     probability of having drawn an outlier-free sample at which to stop early
+                batchSize:      number of hypotheses scored together
+                seed:           seed for the random sampler
+                tol, maxIter:   passed to the refinement solve
+
+    Returns:    R (3x3):        orthonormal rotation matrix
+                t (3x1):        translation
+                inliers (n,):   boolean inlier mask
+    """
+    X = np.asarray(X, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    n = Q.shape[1]
+    sampleSize = 4
+    if n < sampleSize:
+        raise ValueError(f"RANSAC needs at least {sampleSize} correspondences, got {n}")
+    rng = np.random.default_rng(seed)
+    thr2 = threshold * threshold
+    pts3D = np.ascontiguousarray(X.T)
+    pts2D = np.ascontiguousarray(Q.T)
+
+    bestCost = np.inf
+    bestR = None
+    bestT = None
+    drawn = 0
+    # A minimal input has a single distinct sample
+    required = 1 if n == sampleSize else maxHypotheses
+    while drawn < required:
+        b = min(batchSize, required - drawn)
+        drawn += b
+
+        # Minimal solves (P3P plus one point to disambiguate); the p2l iteration needs
+        # hundreds of iterations from a cold start on subsets this small
+        Rs = []
+        ts = []
+        for idx in np.argpartition(rng.random((b, n)), sampleSize - 1, axis=1)[:, :sampleSize]:
+            try:
+                ok, rvec, tvec = cv2.solvePnP(pts3D[idx], pts2D[idx], A, None, flags=cv2.SOLVEPNP_AP3P)
+            except cv2.error:
+                continue
+            if ok:
+                Rs.append(cv2.Rodrigues(rvec)[0])
+                ts.append(tvec)
+        if len(Rs) == 0:
+            continue
+        R = np.array(Rs)
+        t = np.array(ts)
+
+        # MSAC cost: squared error truncated at the inlier threshold
+        errs = reprojectionErrors(R, t, X, Q, A)
+        cost = np.minimum(errs * errs, thr2).sum(axis=1)
+        best = np.argmin(cost)
+        if cost[best] < bestCost:
+            bestCost = cost[best]
+            bestR = R[best]
+            bestT = t[best]
+
+            # Adaptive number of hypotheses given the best inlier ratio so far
+            p = (np.count_nonzero(errs[best] < threshold) / n) ** sampleSize
+            if p >= 1:
+                required = drawn
+            elif p > 0 and confidence < 1:
+                required = min(maxHypotheses, max(drawn, int(np.ceil(np.log(1 - confidence) / np.log1p(-p)))))
+
+    if bestR is None:
+        raise RuntimeError("RANSAC could not solve any hypothesis")
+    inliers = reprojectionErrors(bestR, bestT, X, Q, A) < threshold
+    if np.count_nonzero(inliers) < sampleSize:
+        print("RANSAC found too few inliers, returning best hypothesis without refinement")
+        return bestR, bestT, inliers
+
+    # Refine on inliers, then recompute the inlier set under the refined solution
+    R, t = hand_eye_p2l(X[:, inliers], Q[:, inliers], A, tol=tol, maxIter=maxIter, init=(bestR, bestT))
+    inliers = reprojectionErrors(R, t, X, Q, A) < threshold
+    return R, t, inliers
+
+def _rotationExp(w):
+    """Rotation matrices (..., 3, 3) of rotation vectors (..., 3)"""
+    w = np.asarray(w, dtype=float)
+    angle = np.linalg.norm(w, axis=-1)[..., None, None]
+    K = np.zeros(w.shape[:-1] + (3, 3))
+    K[..., 0, 1], K[..., 0, 2], K[..., 1, 2] = -w[..., 2], w[..., 1], -w[..., 0]
+    K -= np.swapaxes(K, -1, -2)
+    small = angle < 1e-8
+    safeAngle = np.where(small, 1.0, angle)
+    a = np.where(small, 1.0, np.sin(safeAngle) / safeAngle)
+    b = np.where(small, 0.5, (1 - np.cos(safeAngle)) / (safeAngle * safeAngle))
+    return np.eye(3) + a * K + b * (K @ K)
+
+def _robustWeights(errs, threshold, loss):
+    """Robust cost and IRLS weights of residual norms under a Huber or Tukey loss"""
+    if loss == "huber":
+        inside = errs <= threshold
+        cost = np.where(inside, 0.5 * errs * errs, threshold * (errs - 0.5 * threshold))
+        weights = np.where(inside, 1.0, threshold / np.maximum(errs, 1e-12))
+    elif loss == "tukey":
+        inside = errs < threshold
+        u = np.minimum(errs / threshold, 1.0) ** 2
+        cost = threshold * threshold / 6 * (1 - (1 - u) ** 3)
+        weights = np.where(inside, (1 - u) ** 2, 0.0)
+    else:
+        raise ValueError(f"Unknown robust loss {loss}, expected 'huber' or 'tukey'")
+    return cost.sum(), weights
+
+def refineReprojection(R, t, X, Q, A, loss="huber", threshold=None, maxIter=50, tol=1e-8):
+    """
+    Levenberg-Marquardt refinement of a registration on image-space reprojection error, e.g.
+    starting from hand_eye_p2l. The rotation is updated as exp(dw) R and the translation
+    additively; the Jacobian is analytic and evaluated for all points at once, and outliers
+    are down-weighted by a robust loss through iteratively reweighted normal equations.
+
+    Arguments:  R (3x3), t (3x1):   initial rotation and translation, tracker to camera
+                X (3xn):            3D coordinates, tracker space
+                Q (2xn):            2D pixel locations, image space
+                A (3x3):            camera matrix
+                loss (str):         "huber" or "tukey"
+                threshold (float):  loss threshold in pixels; from the initial median residual if None
+                maxIter (int):      maximum number of LM iterations
+                tol (float):        relative cost decrease below which refinement stops
+
+    Returns:    R (3x3), t (3x1):   refined rotation and translation, or the initial ones if refinement
+                                    did not lower the mean pixel error of the points the loss keeps
+                info (dict):        "iterations", "initialErr" and "finalErr" (mean pixel error),
+                                    "threshold", "weights" (n,): final robust weights,
+                                    "accepted": whether the refined solution was returned
+    """
+    X = np.asarray(X, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    R = np.asarray(R, dtype=float)
+    t = np.asarray(t, dtype=float).reshape(3, 1)
+
+    def residuals(R, t):
+        P = R @ X + t
+        q = A @ P
+        return P, q, q[:2] / q[2] - Q
+
+    P, q, r = residuals(R, t)
+    errs = np.sqrt((r * r).sum(axis=0))
+    initialErr = float(np.mean(errs))
+    R0, t0, errs0 = R, t, errs
+    if threshold is None:
+        # Noise sigma from the median residual norm (Rayleigh median is 1.1774 sigma), then
+        # 1.345 sigma (Huber) or 4.685 sigma (Tukey) for 95% efficiency under Gaussian noise
+        sigma = max(np.median(errs) / 1.1774, 1e-6)
+        threshold = (1.345 if loss == "huber" else 4.685) * sigma
+    cost, weights = _robustWeights(errs, threshold, loss)
+    weights0 = weights
+
+    lam = 1e-3
+    iteration = 0
+    for iteration in range(1, maxIter + 1):
+        # d(pixel)/dq (n x 2 x 3), then through A and dP = [-(RX)x | I] [dw; dt]
+        qz = q[2]
+        dProj = np.zeros((X.shape[1], 2, 3))
+        dProj[:, 0, 0] = 1 / qz
+        dProj[:, 1, 1] = 1 / qz
+        dProj[:, :, 2] = -(q[:2] / (qz * qz)).T
+        RX = (P - t).T
+        skew = np.zeros((X.shape[1], 3, 3))
+        skew[:, 0, 1], skew[:, 0, 2], skew[:, 1, 2] = RX[:, 2], -RX[:, 1], RX[:, 0]
+        skew -= np.swapaxes(skew, 1, 2)
+        J = np.concatenate((dProj @ A @ skew, np.broadcast_to(dProj @ A, (X.shape[1], 2, 3))), axis=2)
+
+        H = np.einsum('n,nki,nkj->ij', weights, J, J)
+        g = np.einsum('n,nki,kn->i', weights, J, r)
+
+        improved = False
+        while lam < 1e10:
+            step = np.linalg.solve(H + lam * np.diag(np.diag(H) + 1e-12), -g)
+            newR = _rotationExp(step[:3]) @ R
+            newT = t + step[3:, None]
+            newP, newQ, newRes = residuals(newR, newT)
+            if np.all(newQ[2] > 0):
+                newErrs = np.sqrt((newRes * newRes).sum(axis=0))
+                newCost, newWeights = _robustWeights(newErrs, threshold, loss)
+                if newCost < cost:
+                    improved = True
+                    break
+            lam *= 10
+        if not improved:
+            break
+
+        decrease = (cost - newCost) / max(cost, 1e-12)
+        R, t, P, q, r, errs = newR, newT, newP, newQ, newRes, newErrs
+        cost, weights = newCost, newWeights
+        lam = max(lam / 10, 1e-12)
+        if decrease < tol:
+            break
+
+    # A lower robust cost can still mean a higher pixel error, so the refinement is only kept if it
+    # lowers the mean error of the points the loss keeps (all of them for Huber)
+    kept = weights > 0
+    accepted = bool(np.any(kept)) and np.mean(errs[kept]) < np.mean(errs0[kept])
+    if not accepted:
+        R, t, errs, weights = R0, t0, errs0, weights0
+
+    return R, t, {"iterations": iteration, "initialErr": initialErr, "finalErr": float(np.mean(errs)),
+                  "threshold": float(threshold), "weights": weights, "accepted": accepted}
+
+def crossValidate(X, Q, A, k=None, seed=0, tol=0.001, maxIter=1000, chunkSize=64):
+    """
+    Leave-one-out or k-fold cross-validation of the point-to-line registration. Every fold is
+    refit without its held-out correspondences, warm-started from the solution on all points;
+    folds are solved together with hand_eye_p2l_batch, chunkSize folds at a time.
+
+    Arguments:  X (3xn):        3D coordinates, tracker space
+                Q (2xn):        2D pixel locations, image space
+                A (3x3):        camera matrix
+                k (int):        number of folds, leave-one-out if None or >= n
+                seed:           seed for the random assignment of points to folds
+                tol, maxIter:   passed to the solver
+                chunkSize:      number of folds solved together
+
+    Returns:    result (dict):  "pxErrs", "distErrs", "angularErrs" (nx1): held-out errors of each point,
+                                "summary": summary statistics of the held-out errors (see validateCalibration),
+                                "folds" (n,): fold of each point, "converged" (k,): solver convergence per fold
+    """
+    X = np.asarray(X, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    n = Q.shape[1]
+    if k is None or k >= n:
+        k = n
+        folds = np.arange(n)
+    else:
+        folds = np.random.default_rng(seed).permutation(n) % k
+
+    R, t = hand_eye_p2l(X, Q, A, tol=tol, maxIter=maxIter)
+
+    pxErrs = np.empty((n, 1))
+    distErrs = np.empty((n, 1))
+    angularErrs = np.empty((n, 1))
+    converged = np.empty(k, dtype=bool)
+    for start in range(0, k, chunkSize):
+        chunk = np.arange(start, min(start + chunkSize, k))
+        m = len(chunk)
+        heldOut = folds[None, :] == chunk[:, None]
+        Rs, ts, converged[chunk], iterations = hand_eye_p2l_batch(np.broadcast_to(X, (m, 3, n)),
+                                                                  np.broadcast_to(Q, (m, 2, n)), A, mask=~heldOut,
+                                                                  tol=tol, maxIter=maxIter, init=(R, t))
+        for i in range(m):
+            test = heldOut[i]
+            extMtx = np.vstack((np.hstack((Rs[i], ts[i])), [0, 0, 0, 1]))
+            validation = validateCalibration(extMtx, X[:, test], Q[:, test], A)
+            pxErrs[test] = validation["pxErrs"]
+            distErrs[test] = validation["distErrs"]
+            angularErrs[test] = validation["angularErrs"]
+
+    return {"pxErrs": pxErrs, "distErrs": distErrs, "angularErrs": angularErrs,
+            "summary": summarizeErrors(pxErrs, distErrs, angularErrs), "folds": folds, "converged": converged}
+
+def _rotationLog(R):
+    """Rotation vectors (..., 3) of rotation matrices (..., 3, 3); valid for angles below pi"""
+    cosAngle = np.clip((np.trace(R, axis1=-2, axis2=-1) - 1) / 2, -1.0, 1.0)
+    angle = np.arccos(cosAngle)
+    sinAngle = np.sin(angle)
+    scale = np.where(sinAngle > 1e-12, angle / np.where(sinAngle > 1e-12, sinAngle, 1.0), 1.0)
+    w = np.stack((R[..., 2, 1] - R[..., 1, 2], R[..., 0, 2] - R[..., 2, 0], R[..., 1, 0] - R[..., 0, 1]), axis=-1) / 2
+    return w * scale[..., None]
+
+def bootstrapCalibration(X, Q, A, replicates=1000, seed=0, interval=95, tol=0.001, maxIter=1000, chunkSize=250):
+    """
+    Bootstrap uncertainty of the point-to-line registration. Correspondences are resampled with
+    replacement and every replicate is refit, warm-started from the solution on all points;
+    replicates are solved together with hand_eye_p2l_batch, chunkSize replicates at a time.
+    Rotation spread is measured as the rotation vector (degrees) of each replicate relative to
+    the full solution, about the camera x, y and z axes.
+
+    Arguments:  X (3xn):        3D coordinates, tracker space
+                Q (2xn):        2D pixel locations, image space
+                A (3x3):        camera matrix
+                replicates:     number of bootstrap replicates
+                seed:           seed for the resampling
+                interval:       width in percent of the reported percentile intervals
+                tol, maxIter:   passed to the solver
+                chunkSize:      number of replicates solved together
+
+    Returns:    result (dict):  "extMtx" (4x4): solution on all points,
+                                "rotationStd" (3,), "translationStd" (3,): per-axis standard deviations (deg, mm),
+                                "rotationInterval" (2x3), "translationInterval" (2x3): lower and upper
+                                percentile bounds of the rotation deviation (deg) and translation (mm),
+                                "rotations" (replicates x 3), "translations" (replicates x 3): replicate
+                                rotation deviations and translations, "converged" (replicates,)
+    """
+    X = np.asarray(X, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    n = Q.shape[1]
+    rng = np.random.default_rng(seed)
+    R, t = hand_eye_p2l(X, Q, A, tol=tol, maxIter=maxIter)
+
+    rotations = np.empty((replicates, 3))
+    translations = np.empty((replicates, 3))
+    converged = np.empty(replicates, dtype=bool)
+    for start in range(0, replicates, chunkSize):
+        chunk = slice(start, min(start + chunkSize, replicates))
+        idx = rng.integers(0, n, size=(chunk.stop - chunk.start, n))
+        Rs, ts, converged[chunk], iterations = hand_eye_p2l_batch(np.moveaxis(X[:, idx], 1, 0),
+                                                                  np.moveaxis(Q[:, idx], 1, 0), A,
+                                                                  tol=tol, maxIter=maxIter, init=(R, t))
+        rotations[chunk] = np.degrees(_rotationLog(Rs @ R.T))
+        translations[chunk] = ts[:, :, 0]
+
+    bounds = (50 - interval / 2, 50 + interval / 2)
+    return {"extMtx": np.vstack((np.hstack((R, t)), [0, 0, 0, 1])),
+            "rotationStd": rotations.std(axis=0, ddof=1), "translationStd": translations.std(axis=0, ddof=1),
+            "rotationInterval": np.percentile(rotations, bounds, axis=0),
+            "translationInterval": np.percentile(translations, bounds, axis=0),
+            "rotations": rotations, "translations": translations, "converged": converged}
+
+class OnlineHandEye:
+    """
+    Incremental point-to-line registration for use during a capture sequence. Correspondences
+    are added one at a time and each update warm-starts hand_eye_p2l from the previous R, t, so
+    an update costs a handful of iterations. The change of the estimate between updates is the
+    convergence metric: the estimate counts as stable once the last `window` updates were each
+    valid (every point projects in front of the camera, with a finite pixel error) and moved it
+    by less than rotationTol degrees and translationTol mm.
+    """
+    def __init__(self, A, minCorrespondences=6, window=3, rotationTol=0.1, translationTol=1.0,
+                 tol=0.001, maxIter=1000):
+        self.A = np.asarray(A, dtype=float)
+        self.minCorrespondences = minCorrespondences
+        self.window = window
+        self.rotationTol = rotationTol
+        self.translationTol = translationTol
+        self.tol = tol
+        self.maxIter = maxIter
+        self.X = np.empty((3, 0))
+        self.Q = np.empty((2, 0))
+        self.R = None
+        self.t = None
+        self.history = []
+
+    @property
+    def extMtx(self):
+        """Current 4x4 extrinsic matrix, or None before the first estimate"""
+        if self.R is None:
+            return None
+        return np.vstack((np.hstack((self.R, self.t)), [0, 0, 0, 1]))
+
+    @property
+    def isStable(self):
+        """True once the last `window` updates were each valid and changed the estimate by less than the tolerances"""
+        recent = self.history[-self.window:]
+        return len(recent) == self.window and all(
+            h["valid"] and h["rotationChange"] < self.rotationTol and h["translationChange"] < self.translationTol
+            for h in recent)
+
+    def add(self, X, q):
+        """
+        Adds one correspondence and updates the estimate
+
+        Arguments:  X (3,):         stylus tip position, tracker space
+                    q (2,):         stylus tip pixel location in the image of camera matrix A
+
+        Returns:    update (dict):  "n", "extMtx" (4x4), "pxErr": mean pixel error, "rotationChange" (deg)
+                                    and "translationChange" (mm) since the previous estimate, "iterations",
+                                    "valid": all points in front of the camera with a finite pixel error,
+                                    and "stable"; None while there are fewer than minCorrespondences
+        """
+        self.X = np.hstack((self.X, np.reshape(X, (3, 1)).astype(float)))
+        self.Q = np.hstack((self.Q, np.reshape(q, (2, 1)).astype(float)))
+        n = self.Q.shape[1]
+        if n < self.minCorrespondences:
+            return None
+
+        R, t, info = hand_eye_p2l(self.X, self.Q, self.A, tol=self.tol, maxIter=self.maxIter,
+                                  init=None if self.R is None else (self.R, self.t), returnInfo=True)
+        errs = reprojectionErrors(R, t, self.X, self.Q, self.A)
+        if self.R is not None and (not info["converged"] or not np.all(np.isfinite(errs))):
+            # Warm start fell into a mirrored or stalled solution: solve again from scratch
+            R, t, info = hand_eye_p2l(self.X, self.Q, self.A, tol=self.tol, maxIter=self.maxIter, returnInfo=True)
+            errs = reprojectionErrors(R, t, self.X, self.Q, self.A)
+        if self.R is None:
+            rotationChange = translationChange = np.inf
+        else:
+            rotationChange = float(np.degrees(np.linalg.norm(_rotationLog(R @ self.R.T))))
+            translationChange = float(np.linalg.norm(t - self.t))
+        self.R, self.t = R, t
+
+        # Points behind the camera (a mirrored solution) have an infinite pixel error
+        pxErr = float(np.mean(errs))
+        update = {"n": n, "extMtx": self.extMtx,
+                  "pxErr": pxErr,
+                  "rotationChange": rotationChange, "translationChange": translationChange,
+                  "iterations": info["iterations"], "valid": bool(np.isfinite(pxErr))}
+        self.history.append(update)
+        update["stable"] = self.isStable
+        return update
+
+def orderedMap(func, items, workers=None):
+    """
+    Applies func to items on a thread pool and yields the results in input order. OpenCV
+    releases the GIL in its image processing calls, so threads scale with cores without
+    pickling images between processes. At most 2 * workers items are in flight at once.
+
+    Arguments:  func (callable):    function of one item
+                items (list):       inputs
+                workers (int):      number of threads, os.cpu_count() if None
+    """
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for item in items:
+            pending.append(pool.submit(func, item))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+def undistortCircle(center, radius, intMtx, distCoeffs, newCameraMtx):
+    """
+    Maps a circle detected in a distorted image into the undistorted image with camera matrix newCameraMtx
+
+    Arguments:  center (tuple):                 circle center (x, y) in the distorted image
+                radius (float):                 circle radius in the distorted image
+                intMtx (np.ndarray, 3x3):       camera intrinsic matrix
+                distCoeffs (np.ndarray, 1x5):   camera distortion coefficients
+                newCameraMtx (np.ndarray, 3x3): camera matrix of the undistorted image
+
+    Returns:    center (np.ndarray, 2,):        undistorted circle center
+                radius (float):                 undistorted circle radius
+    """
+    pts = np.array([[[center[0], center[1]]], [[center[0] + radius, center[1]]]], dtype=np.float64)
+    pts = cv2.undistortPoints(pts, intMtx, distCoeffs, P=newCameraMtx)[:, 0, :]
+    return pts[0], float(np.linalg.norm(pts[1] - pts[0]))
+
+def greenTipMask(img):
+    """Binary mask of the green stylus tip"""
+    # Colour threshold for green
+    hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
+    mask = cv2.inRange(hsv, (30, 50, 0), (80, 255, 255))
+    target = cv2.bitwise_and(img, img, mask=mask)
+    # Apply binary mask
+    gray = cv2.cvtColor(target, cv2.COLOR_BGR2GRAY)
+    th, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY)
+    return binary
+
+def maskCoverage(binary, center, radius):
+    """Fraction of a circle's disk covered by a binary mask, used as a detection confidence"""
+    disk = np.zeros_like(binary)
+    cv2.circle(disk, (int(round(center[0])), int(round(center[1]))), max(int(round(radius)), 1), 255, -1)
+    area = np.count_nonzero(disk)
+    return np.count_nonzero(cv2.bitwise_and(binary, disk)) / area if area > 0 else 0.0
+
+def houghDetector(img, StylusTipColour="green", binary=None):
+    """
+    Stylus tip detector based on smoothing and cv2.HoughCircles
+
+    Arguments:  img (np.ndarray):       BGR image
+                StylusTipColour (str):  "green" to threshold on the green tip, otherwise grayscale
+                binary (np.ndarray):    precomputed greenTipMask(img), optional
+
+    Returns:    detection:              (center (x, y), radius, confidence), or None if nothing was found
+    """
+    if StylusTipColour == "green":
+        if binary is None:
+            binary = greenTipMask(img)
+
+        # Smooth
+        blurred = cv2.medianBlur(binary, 25)
+
+    else:
+        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        blurred = cv2.medianBlur(gray, 25)
+
+    blurred = cv2.blur(blurred, (10, 10))
+
+    # Use Hough to find circles
+    circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, 0.1, 1000, param1=50, param2=30, minRadius=0, maxRadius=50)
+    if circles is None:
+        return None
+
+    for i in circles[0, :]:
+        center = (float(i[0]), float(i[1]))
+        radius = float(i[2])
+    confidence = maskCoverage(binary, center, radius) if binary is not None else 1.0
+    return center, radius, confidence
+
+def momentsDetector(img, StylusTipColour="green", minArea=50, maxRadius=50, minFill=0.55, minAspect=0.5):
+    """
+    Fast stylus tip detector: picks the largest plausibly circular connected component of the
+    green tip mask and returns its sub-pixel centroid from image moments. Falls back to
+    houghDetector when no component passes the blob test.
+
+    Arguments:  img (np.ndarray):       BGR image
+                StylusTipColour (str):  only "green" is supported, other colours use houghDetector
+                minArea (int):          smallest blob area in pixels
+                maxRadius (float):      largest equivalent blob radius in pixels
+                minFill (float):        smallest ratio of blob area to bounding box area (a disk gives pi/4)
+                minAspect (float):      smallest ratio of bounding box short side to long side
+
+    Returns:    detection:              (center (x, y), radius, confidence), or None if nothing was found
+    """
+    if StylusTipColour != "green":
+        return houghDetector(img, StylusTipColour)
+
+    mask = greenTipMask(img)
+    binary = cv2.morphologyEx(mask, cv2.MORPH_OPEN, cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (5, 5)))
+    numLabels, labels, stats, centroids = cv2.connectedComponentsWithStats(binary, connectivity=8)
+
+    # Largest blobs first, skipping the background label
+    for label in 1 + np.argsort(-stats[1:, cv2.CC_STAT_AREA]):
+        x, y, w, h, area = stats[label]
+        if area < minArea:
+            break
+        fill = area / float(w * h)
+        aspect = min(w, h) / float(max(w, h))
+        radius = np.sqrt(area / np.pi)
+        if radius > maxRadius or fill < minFill or aspect < minAspect:
+            continue
+
+        # Sub-pixel centroid of the blob
+        m = cv2.moments((labels[y:y + h, x:x + w] == label).astype(np.uint8), binaryImage=True)
+        center = (float(x + m["m10"] / m["m00"]), float(y + m["m01"] / m["m00"]))
+        confidence = max(0.0, 1.0 - abs(fill - np.pi / 4) / (np.pi / 4)) * aspect
+        return center, float(radius), float(confidence)
+
+    # The fallback reuses the tip mask rather than thresholding the image again
+    return houghDetector(img, StylusTipColour, binary=mask)
+
+# Stylus tip detectors selectable by name in detectCircle/analyzeFrames
+DETECTORS = {
+    "hough": houghDetector,
+    "moments": momentsDetector,
+}
+
+def loadFrame(fname, intMtx, distCoeffs, cacheDir=None, undistortFrame=True):
+    """
+    Reads one capture, undistorted if undistortFrame
+
+    Returns:    img (np.ndarray):               image (undistorted if undistortFrame)
+                newCameraMtx (np.ndarray, 3x3): camera matrix of the undistorted image
+    """
+    img = cv2.imread(fname)
+
+    # Undistort
+    if undistortFrame:
+        img, newCameraMtx = Undistortion.undistortImage(img, intMtx, distCoeffs, cacheDir=cacheDir)
+    else:
+        h, w = img.shape[:2]
+        newCameraMtx, roi = cv2.getOptimalNewCameraMatrix(intMtx, distCoeffs, (w, h), 1, (w, h))
+    return img, newCameraMtx
+
+def detectorKey(detector):
+    """
+    Stable name of a detector and its parameters for cache keys: the DETECTORS name (also for the
+    function registered under it), the qualified name of another module-level function, or that of
+    a functools.partial of one with its bound arguments. None for detectors without a stable name
+    (lambdas, nested functions, other callables).
+    """
+    if not callable(detector):
+        return detector
+    for name, func in DETECTORS.items():
+        if func is detector:
+            return name
+    if isinstance(detector, functools.partial):
+        func = detectorKey(detector.func)
+        if func is None:
+            return None
+        return f"{func}(*{detector.args!r}, **{sorted(detector.keywords.items())!r})"
+    qualname = getattr(detector, "__qualname__", None)
+    if not inspect.isfunction(detector) or qualname is None or "<" in qualname:
+        return None
+    return f"{detector.__module__}.{qualname}"
+
+def cachedDetectCircle(fname, intMtx, distCoeffs, cache, StylusTipColour="green", cacheDir=None,
+                       undistortFrame=True, detector="hough"):
+    """
+    detectCircle backed by a CalibrationCache.ResultCache keyed by the image content, detector
+    parameters and intrinsics. On a cache hit the image is not decoded and img is None.
+    The detector must have a stable name (see detectorKey).
+
+    Returns:    img (np.ndarray or None):       image searched, None if the detection came from the cache
+                newCameraMtx (np.ndarray, 3x3): camera matrix of the undistorted image
+                detection:                      (center (x, y), radius, confidence), or None if nothing was found
+    """
+    name = detectorKey(detector)
+    if name is None:
+        raise ValueError(f"Detector {detector!r} has no stable name to cache its results under")
+    params = {
+        "version": 1,
+        "detector": name,
+        "StylusTipColour": StylusTipColour,
+        "undistortFrame": undistortFrame,
+        "intMtx": np.asarray(intMtx),
+        "distCoeffs": np.asarray(distCoeffs),
+    }
+    key = cache.key(fname, params)
+    entry = cache.get(key)
+    if entry is not None:
+        detection = None if entry["rejected"] else (tuple(entry["center"]), entry["radius"], entry["confidence"])
+        return None, np.array(entry["newCameraMtx"]), detection
+
+    img, newCameraMtx, detection = detectCircle(fname, intMtx, distCoeffs, StylusTipColour, cacheDir, undistortFrame,
+                                                detector)
+    entry = {"rejected": detection is None, "newCameraMtx": np.asarray(newCameraMtx).tolist()}
+    if detection is not None:
+        center, radius, confidence = detection
+        entry["center"] = [float(center[0]), float(center[1])]
+        entry["radius"] = float(radius)
+        entry["confidence"] = float(confidence)
+    cache.put(key, entry)
+    return img, newCameraMtx, detection
+
+def detectCircle(fname, intMtx, distCoeffs, StylusTipColour="green", cacheDir=None, undistortFrame=True,
+                 detector="hough"):
+    """
+    Reads and undistorts one capture and searches it for the stylus tip.
+    With undistortFrame=False the search runs on the raw distorted image, and the detection
+    returned is in raw image coordinates (see undistortCircle).
+
+    Arguments:  fname (str):                    stylus image file name
+                intMtx (np.ndarray, 3x3):       camera intrinsic matrix
+                distCoeffs (np.ndarray, 1x5):   camera distortion coefficients
+                StylusTipColour (str):          "green" to threshold on the green tip, otherwise grayscale
+                cacheDir (str):                 directory to persist undistortion maps in
+                undistortFrame (bool):          undistort the image before the search
+                detector (str or callable):     name in DETECTORS, or a function with the same interface
+
+    Returns:    img (np.ndarray):               image searched (undistorted if undistortFrame)
+                newCameraMtx (np.ndarray, 3x3): camera matrix of the undistorted image
+                detection:                      (center (x, y), radius, confidence), or None if nothing was found
+    """
+    img, newCameraMtx = loadFrame(fname, intMtx, distCoeffs, cacheDir, undistortFrame)
+    if not callable(detector):
+        detector = DETECTORS[detector]
+    return img, newCameraMtx, detector(img, StylusTipColour)
+
+def manualCircleSegmentation(img):
+    """
+    Lets the user click points around the stylus tip (Esc to finish) and fits a circle to them
+
+    Arguments:  img (np.ndarray):   undistorted image, clicked points are drawn onto it
+
+    Returns:    circle:             ((x, y), radius) as returned by cv2.minEnclosingCircle
+    """
+    def click_event(event, cx, cy, flags, params):
+        if event == cv2.EVENT_LBUTTONDOWN:
+            cv2.circle(img, (cx, cy), 1, (0, 255, 255), -1)
+            pts.append([cx, cy])
+
+    pts = []
+
+    cv2.namedWindow("Segment Image")
+
+    cv2.setMouseCallback("Segment Image", click_event)
+
+    while True:
+        cv2.imshow("Segment Image", img)
+        k = cv2.waitKey(1) & 0xFF
+        if k == 27:
+            break
+    cv2.destroyAllWindows()
+    return cv2.minEnclosingCircle(np.array(pts))
+
+def reviewFrames(frames, reviewQueue, intMtx, distCoeffs, cacheDir=None):
+    """
+    Deferred manual review of frames rejected by a non-interactive analyzeFrames run; pass the
+    result back as analyzeFrames(..., reviewedCenters=centers)
+
+    Arguments:  frames (list[str]):             list of stylus image file names
+                reviewQueue (list[int]):        indices of frames to review
+                intMtx (np.ndarray, 3x3):       camera intrinsic matrix
+                distCoeffs (np.ndarray, 1x5):   camera distortion coefficients
+                cacheDir (str):                 directory to persist undistortion maps in
+
+    Returns:    centers (dict):                 frame index -> manually segmented circle center (x, y)
+                                                in the undistorted image
+    """
+    centers = {}
+    for count in reviewQueue:
+        img, newCameraMtx = loadFrame(frames[count], intMtx, distCoeffs, cacheDir)
+        circle = manualCircleSegmentation(img)
+        centers[count] = circle[0]
+    return centers
+
+def writeReprojectionImages(frames, px, frameIndices, intMtx, distCoeffs, outputDir, show=False, cacheDir=None):
+    """
+    Draws reprojected stylus tips onto the undistorted captures and writes them to outputDir
+    as reprojection_<capture>.png. Writing happens on a background thread.
+
+    Arguments:  frames (list[str]):             list of stylus image file names
+                px (np.ndarray, 2xn):           reprojected pixels as returned by analyzeFrames
+                frameIndices (list[int]):       frame index of each reprojected pixel
+                intMtx (np.ndarray, 3x3):       camera intrinsic matrix
+                distCoeffs (np.ndarray, 1x5):   camera distortion coefficients
+                outputDir (str):                output directory, created if needed
+                show (bool):                    also display each image and wait for a key press
+                cacheDir (str):                 directory to persist undistortion maps in
+    """
+    os.makedirs(outputDir, exist_ok=True)
+    with ThreadPoolExecutor(max_workers=1) as writer:
+        for i, count in enumerate(frameIndices):
+            try:
+                img, newCamMat = Undistortion.undistortImage(cv2.imread(frames[count]), intMtx, distCoeffs,
+                                                             cacheDir=cacheDir)
+                if np.all(np.isfinite(px[:, i])):
+                    pxx = np.uint16(np.round(px[0, i]))
+                    pxy = np.uint16(np.round(px[1, i]))
+                    cv2.circle(img, (pxx, pxy), 1, (0, 255, 255), 2)
+                    if show:
+                        cv2.imshow("pixel error image", img)
+                        cv2.waitKey(0)
+                    writer.submit(cv2.imwrite, f"{outputDir}/reprojection_{count + 1}.png", img)
+            except:
+                print("could not draw pixel onto image")
+
+def listCaptureFrames(framesDir):
+    """
+    Lists capture images in a capture sequence directory, in capture order
+
+    Arguments:  framesDir (str):    directory holding capture_1.png, capture_2.png, ...
+
+    Returns:    frames (list[str]): list of stylus image file names
+    """
+    numFrames = len([f for f in os.listdir(framesDir) if f.endswith('.png')])
+    return [f"{framesDir}/capture_{i + 1}.png" for i in range(numFrames)]
+
+
+# Fewest correspondences analyzeFrames solves from (the minimal RANSAC sample)
+MIN_CALIBRATION_FRAMES = 4
+
+
+def analyzeFrames(frames, transforms, intMtx, distCoeffs, ransac=False, ransacThreshold=5.0, refine=False,
+                  refineLoss="huber", workers=None,
+                  interactive=True, overlayDir=None, cacheDir=None, undistortFrames=True, detector="hough",
+                  detectionCacheFile=None, reviewedCenters=None, crossValidation=None, bootstrap=None, bootstrapSeed=0,
+                  returnInfo=False):
     """
     Based on: https://github.com/TaraKemper/VideoBasedHandEye/blob/main/HandEyeCalibration.py
     Arguments:  frames (list[str]):                 list of stylus image file names
                 transforms (np.ndarray, nx3):       array of tracking position data
                 intMtx (np.ndarray, 3x3):           camera intrinsic matrix
                 distCoeffs (np.ndarray, 1x5):       camera distortion coefficients
+                ransac (bool):                      use outlier-robust hand_eye_p2l_ransac for the solve
+                ransacThreshold (float):            RANSAC inlier threshold in pixels
+                refine (bool):                      refine the solve on pixel reprojection error (refineReprojection)
+                refineLoss (str):                   robust loss of the refinement, "huber" or "tukey"
+                workers (int):                      number of detection threads, os.cpu_count() if None
+                interactive (bool):                 show each detection and ask for manual segmentation when
+                                                    no circle is found; if False nothing is displayed and
+                                                    such frames are rejected and queued for later review
+                overlayDir (str):                   if given, detection overlays are written there in the background
+                cacheDir (str):                     directory to persist undistortion maps in
+                undistortFrames (bool):             undistort whole frames before detection; if False detection
+                                                    runs on the raw frames and only the detected centers are
+                                                    undistorted (faster, overlays are then in raw coordinates)
+                detector (str or callable):         stylus tip detector, "hough" or "moments" (see DETECTORS)
+                detectionCacheFile (str):           if given, per-image detections are cached in this file and
+                                                    only frames that changed are detected again (not for
+                                                    detectors without a stable name, see detectorKey)
+                reviewedCenters (dict):             frame index -> circle center (x, y) in the undistorted image
+                                                    from a deferred review (reviewFrames), used in place of
+                                                    the detection of that frame
+                crossValidation (int or str):       if given, also report held-out errors from crossValidate
+                                                    with this many folds, or leave-one-out for "loo"
+                bootstrap (int):                    if given, also report bootstrapCalibration uncertainty
+                                                    from this many replicates
+                bootstrapSeed:                      seed for the bootstrap resampling
+                returnInfo (bool):                  if True, also return a dict of details about the run
 
     Returns:    calibration (np.ndarray, 4x4):      extrinsic calibration matrix
                 px (np.ndarray, 2xn)                reprojected pixels (i.e. from 3D points)
-                pxErrs (np.ndarray, n,):            pixel reprojection error
-                distErrs (np.ndarray, n,):          distance error
-                angularErrs (np.ndarray, n,):       angular error
+                pxErrs (np.ndarray, nx1):           pixel reprojection error in the undistorted image, the
+                                                    one the solve and the refinement minimise
+                distErrs (np.ndarray, nx1):         distance error
+                angularErrs (np.ndarray, nx1):      angular error
+                info (dict):                        (only if returnInfo) details of the run:
+                                                    "inliers": boolean mask over the n correspondences
+                                                    (all True without ransac),
+                                                    "frameIndices": frame index of each correspondence,
+                                                    "confidences": detection confidence of each correspondence,
+                                                    "reviewQueue": indices of frames rejected for having
+                                                    no detection (non-interactive only),
+                                                    "trackingLost": indices of frames dropped for lost tracking
+                                                    "summary": error summary statistics (see validateCalibration)
+                                                    "refinement": refineReprojection info, if refine
+                                                    "crossValidation": crossValidate result, if requested
+                                                    "bootstrap": bootstrapCalibration result, if requested
     
     """
     # Lists for 3D data
@@ -80,133 +984,346 @@ def analyzeFrames(frames, transforms, intMtx, distCoeffs):
     CircleCentersX = ([])
     CircleCentersY = ([])
 
-    StylusTipColour = "green"
-    # Detect circle center in each frame (2D point)
-    numFrames = len(frames)
-    for count in range(numFrames):
-        img = cv2.imread(frames[count])
+    frameIndices = []
+    confidences = []
+    reviewQueue = []
+    trackingLost = []
+    writer = ThreadPoolExecutor(max_workers=1) if overlayDir is not None else None
+    if overlayDir is not None:
+        os.makedirs(overlayDir, exist_ok=True)
+
+    # Detect circle center in each frame (2D point), fanned out over a worker pool and
+    # gathered back in frame order
+    if detectionCacheFile is not None and detectorKey(detector) is None:
+        print("Detector has no stable name (e.g. a lambda), detections are not cached")
+        detectionCacheFile = None
+    if detectionCacheFile is None:
+        detections = orderedMap(lambda fname: detectCircle(fname, intMtx, distCoeffs, cacheDir=cacheDir,
+                                                           undistortFrame=undistortFrames, detector=detector),
+                                frames, workers)
+    else:
+        detectionCache = CalibrationCache.ResultCache(detectionCacheFile)
+        detections = orderedMap(lambda fname: cachedDetectCircle(fname, intMtx, distCoeffs, detectionCache,
+                                                                 cacheDir=cacheDir, undistortFrame=undistortFrames,
+                                                                 detector=detector),
+                                frames, workers)
+    try:
+        for count, (img, newCameraMtx, detection) in enumerate(detections):
+            c = transforms[count]
+            x = c[0]
+            y = c[1]
+            z = c[2]
+
+            # Cached detections skip decoding, so the image is only read when it is shown or written
+            if img is None and (interactive or writer is not None):
+                img, newCameraMtx = loadFrame(frames[count], intMtx, distCoeffs, cacheDir, undistortFrames)
+
+            reviewed = reviewedCenters is not None and count in reviewedCenters
+            if reviewed:
+                # Center segmented by hand in a deferred review (see reviewFrames), in the undistorted image
+                center = reviewedCenters[count]
+                radius = 0.0
+                confidence = 1.0
+                if img is not None and undistortFrames:
+                    cv2.circle(img, (int(np.around(center[0])), int(np.around(center[1]))), 1, (0, 100, 100), 3)
+
+            # Draw calculated circle onto image
+            elif detection is None and not interactive:
+                # Without a display, frames with no detection are set aside for later review
+                print(f"No circles detected in frame {count}. Frame rejected and queued for review")
+                reviewQueue.append(count)
+                continue
+
+            elif detection is None:
+                # If no circle is detected, allow user to manually segment circle
+                print(f"No circles detected in frame {count}. Try manual circle segmentation")
+                circle = manualCircleSegmentation(img)
+                circle_x_int = np.uint16(np.around(circle[0][0]))
+                circle_y_int = np.uint16(np.around(circle[0][1]))
+                circle_r_int = np.uint16(np.around(circle[1]))
+
+                # Draw resultant circle on image
+                cv2.circle(img, (circle_x_int, circle_y_int), 1, (0, 100, 100), 3)
+                cv2.circle(img, (circle_x_int, circle_y_int), circle_r_int, (255, 0, 255), 3)
+                cv2.imshow("circle overlay", img)
+                cv2.waitKey(0)
+                center, radius = circle
+                confidence = 1.0
 
-        # Undistort
-        h, w = img.shape[:2]
-        newCameraMtx, roi = cv2.getOptimalNewCameraMatrix(intMtx, distCoeffs, (w, h), 1, (w, h))
-        img = cv2.undistort(img, intMtx, distCoeffs, None, newCameraMtx)
-
-        if StylusTipColour == "green":
-
-            # Colour threshold for green
-            hsv = cv2.cvtColor(img, cv2.COLOR_BGR2HSV)
-            mask = cv2.inRange(hsv, (30, 50, 0), (80, 255, 255))
-            target = cv2.bitwise_and(img, img, mask=mask)
-            # Apply binary mask
-            gray = cv2.cvtColor(target, cv2.COLOR_BGR2GRAY)
-            th, binary = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY)
-
-            # Smooth
-            blurred = cv2.medianBlur(binary, 25)
-
-        else:
-            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-            blurred = cv2.medianBlur(gray, 25)
-
-        blurred = cv2.blur(blurred, (10, 10))
-
-        # Use Hough to find circles
-        circles = cv2.HoughCircles(blurred, cv2.HOUGH_GRADIENT, 0.1, 1000, param1=50, param2=30, minRadius=0, maxRadius=50)
-
-        c = transforms[count]
-        x = c[0]
-        y = c[1]
-        z = c[2]
-
-        # Draw calculated circle onto image
-        if circles is None:
-            # If Hough transform detects no circles, allow user to manually segment circle
-            print(f"No circles detected in frame {count}. Try manual circle segmentation")
-            def click_event(event, cx, cy, flags, params):
-                if event == cv2.EVENT_LBUTTONDOWN:
-                    cv2.circle(img, (cx, cy), 1, (0, 255, 255), -1)
-                    pts.append([cx, cy])
-
-            pts = []
-
-            cv2.namedWindow("Segment Image")
-
-            cv2.setMouseCallback("Segment Image", click_event)
+            else:
+                center, radius, confidence = detection
+
+                # Convert circle parameters a, b, r to ints
+                if img is not None:
+                    center_asint = (int(np.around(center[0])), int(np.around(center[1])))
+                    cv2.circle(img, center_asint, 1, (0, 100, 100), 3)
+                    cv2.circle(img, center_asint, int(np.around(radius)), (255, 0, 255), 3)
+                if interactive:
+                    cv2.imshow("circle overlay", img)
+                    cv2.waitKey(0)
+
+                if len(StylusTipCoordsX) > 0 and StylusTipCoordsX[-1] == x:
+                    # Repeated 3D coordinate indicates that tracking is lost
+                    print(f"Spatial tracking lost in frame {count}")
+                    trackingLost.append(count)
+                    continue
+
+            if writer is not None:
+                writer.submit(cv2.imwrite, f"{overlayDir}/detection_{count + 1}.png", img)
+
+            # Only the detected center is mapped into the undistorted image
+            if not undistortFrames and not reviewed:
+                center, radius = undistortCircle(center, radius, intMtx, distCoeffs, newCameraMtx)
+
+            # Add circle centers to list
+            CircleCentersX = np.append(CircleCentersX, center[0])
+            CircleCentersY = np.append(CircleCentersY, center[1])
 
-            while True:
-                cv2.imshow("Segment Image", img)
-                k = cv2.waitKey(1) & 0xFF
-                if k == 27:
-                    break
-            cv2.destroyAllWindows()
-            circle = cv2.minEnclosingCircle(np.array(pts))
-            circle_x_int = np.uint16(np.around(circle[0][0]))
-            circle_y_int = np.uint16(np.around(circle[0][1]))
-            circle_r_int = np.uint16(np.around(circle[1]))
-
-            # Draw resultant circle on image
-            cv2.circle(img, (circle_x_int, circle_y_int), 1, (0, 100, 100), 3)
-            cv2.circle(img, (circle_x_int, circle_y_int), circle_r_int, (255, 0, 255), 3)
-            cv2.imshow("circle overlay", img)
-            cv2.waitKey(0)
-            CircleCentersX = np.append(CircleCentersX, circle[0][0])
-            CircleCentersY = np.append(CircleCentersY, circle[0][1])
-            
             # Add corresponding transforms to list
             StylusTipCoordsX = np.append(StylusTipCoordsX, x)
             StylusTipCoordsY = np.append(StylusTipCoordsY, y)
             StylusTipCoordsZ = np.append(StylusTipCoordsZ, z)
+            frameIndices.append(count)
+            confidences.append(confidence)
 
-        else:
-            # Convert circle parameters (as detected by Hough transform) a, b, r to ints
-            circles_asint = np.uint16(np.around(circles))
-            for i in circles_asint[0, :]:
-                center_asint = (i[0], i[1])
-                cv2.circle(img, center_asint, 1, (0, 100, 100), 3)
-                radius = i[2]
-                cv2.circle(img, center_asint, radius, (255, 0, 255), 3)
-            cv2.imshow("circle overlay", img)
-            cv2.waitKey(0)
-
-            for i in circles[0, :]:
-                center = (i[0], i[1])
-
-            if len(StylusTipCoordsX) > 0 and StylusTipCoordsX[-1] == x:
-                # Repeated 3D coordinate indicates that tracking is lost
-                print(f"Spatial tracking lost in frame {count}")
-            else:
-                # Add circle centers to list
-                CircleCentersX = np.append(CircleCentersX, center[0])
-                CircleCentersY = np.append(CircleCentersY, center[1])
-
-                # Add corresponding transforms to list
-                StylusTipCoordsX = np.append(StylusTipCoordsX, x)
-                StylusTipCoordsY = np.append(StylusTipCoordsY, y)
-                StylusTipCoordsZ = np.append(StylusTipCoordsZ, z)
+    finally:
+        # Pending overlay writes are flushed even if a frame raises
+        if writer is not None:
+            writer.shutdown(wait=True)
+    if detectionCacheFile is not None:
+        detectionCache.save()
+        print(f"Detection cache: {detectionCache.hits} hits, {detectionCache.misses} misses")
 
     StylusTipCoords = np.vstack((StylusTipCoordsX, StylusTipCoordsY, StylusTipCoordsZ))
     CircleCenters = np.vstack((CircleCentersX, CircleCentersY))
+    if len(frameIndices) < MIN_CALIBRATION_FRAMES:
+        raise ValueError(f"Only {len(frameIndices)} of {len(frames)} frames are usable for calibration, "
+                         f"at least {MIN_CALIBRATION_FRAMES} are needed ({len(reviewQueue)} without a "
+                         f"detection, {len(trackingLost)} with lost tracking)")
 
     # Run calibration procedure
-    R, t = hand_eye_p2l(StylusTipCoords, CircleCenters, newCameraMtx)
+    if ransac:
+        R, t, inliers = hand_eye_p2l_ransac(StylusTipCoords, CircleCenters, newCameraMtx, threshold=ransacThreshold)
+        print(f"RANSAC rejected {np.count_nonzero(~inliers)} of {len(inliers)} correspondences as outliers")
+    else:
+        R, t = hand_eye_p2l(StylusTipCoords, CircleCenters, newCameraMtx)
+        inliers = np.ones(CircleCenters.shape[1], dtype=bool)
+    refineInfo = None
+    if refine:
+        R, t, refineInfo = refineReprojection(R, t, StylusTipCoords[:, inliers], CircleCenters[:, inliers], newCameraMtx,
+                                              loss=refineLoss)
+        print(f"Reprojection refinement: mean pixel error {refineInfo['initialErr']} -> {refineInfo['finalErr']} "
+              f"in {refineInfo['iterations']} iterations"
+              f"{'' if refineInfo['accepted'] else ', refinement did not lower the error and was discarded'}")
     calibration = np.vstack((np.hstack((R, t)), [0, 0, 0, 1]))
     print("Extrinsic Matrix:", calibration)
 
-    # Validation
-    px, pxErrs = PixelValidation(calibration, StylusTipCoords, CircleCenters, intMtx)
-    distErrs = DistanceValidation(calibration, StylusTipCoords, CircleCenters, intMtx)
-    angularErrs = AngularValidation(calibration, StylusTipCoords, CircleCenters, intMtx)
-
+    # Validation, in the undistorted image the circle centers were found in
+    validation = validateCalibration(calibration, StylusTipCoords, CircleCenters, newCameraMtx)
+    px = validation["px"]
+    pxErrs = validation["pxErrs"]
+    distErrs = validation["distErrs"]
+    angularErrs = validation["angularErrs"]
+
+    crossValidationResult = None
+    if crossValidation is not None:
+        k = None if crossValidation == "loo" else int(crossValidation)
+        crossValidationResult = crossValidate(StylusTipCoords[:, inliers], CircleCenters[:, inliers], newCameraMtx, k=k)
+        print("Training errors:", summarizeErrors(pxErrs[inliers], distErrs[inliers], angularErrs[inliers]))
+        print("Cross-validated (held-out) errors:", crossValidationResult["summary"])
+
+    bootstrapResult = None
+    if bootstrap is not None:
+        bootstrapResult = bootstrapCalibration(StylusTipCoords[:, inliers], CircleCenters[:, inliers], newCameraMtx,
+                                               replicates=bootstrap, seed=bootstrapSeed)
+        print("Bootstrap rotation std (deg, x/y/z):", bootstrapResult["rotationStd"])
+        print("Bootstrap translation std (mm, x/y/z):", bootstrapResult["translationStd"])
+
+    if returnInfo:
+        info = {"inliers": inliers, "frameIndices": frameIndices, "confidences": np.array(confidences),
+                "reviewQueue": reviewQueue, "trackingLost": trackingLost, "summary": validation["summary"],
+                "refinement": refineInfo, "crossValidation": crossValidationResult, "bootstrap": bootstrapResult}
+        return calibration, px, pxErrs, distErrs, angularErrs, info
     return calibration, px, pxErrs, distErrs, angularErrs
 
-def distortionCalibration(chessboardFiles):
+def findChessboard(fpath, criteria, patternSize=(9, 6), coarseLevels=None, maxSearchWidth=1000, fastCheck=True):
+    """
+    Finds and refines chessboard corners in one image. The board is searched for on a
+    downsampled pyramid level, then the corners are scaled back up and refined with
+    cornerSubPix at full resolution.
+
+    Arguments:  fpath (str):                    chessboard image file name
+                criteria (tuple):               cv2.cornerSubPix termination criteria
+                patternSize (tuple):            inner corners per chessboard row and column
+                coarseLevels (int):             number of pyrDown levels to search on; if None, as many as
+                                                needed to bring the width down to maxSearchWidth
+                maxSearchWidth (int):           largest search image width when coarseLevels is None
+                fastCheck (bool):               reject images without a board early (cv2.CALIB_CB_FAST_CHECK)
+
+    Returns:    corners (np.ndarray or None):   refined corners, None if the board was not found
+                imageSize (tuple):              image size (w, h)
+    """
+    img = cv2.imread(fpath)
+
+    #img = img[0,::-1,::-1,:] # may be unnecessary with sksurg preprocessing (compared to slicer)
+    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+
+    # Downsample for the search
+    if coarseLevels is None:
+        coarseLevels = 0
+        while (gray.shape[1] >> coarseLevels) > maxSearchWidth:
+            coarseLevels += 1
+    search = gray
+    for _ in range(coarseLevels):
+        search = cv2.pyrDown(search)
+
+    # Find checkerboard corners
+    flags = cv2.CALIB_CB_ADAPTIVE_THRESH + cv2.CALIB_CB_NORMALIZE_IMAGE
+    if fastCheck:
+        flags += cv2.CALIB_CB_FAST_CHECK
+    ret, corners = cv2.findChessboardCorners(search, patternSize, flags=flags)
+    # If found, scale up to full resolution and refine; pyrDown keeps the even source pixels, so
+    # pixel x of a level is pixel 2x of the level above
+    if ret:
+        corners = corners * 2 ** coarseLevels
+        corners = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
+    else:
+        corners = None
+    return corners, gray.shape[::-1]
+
+def cachedFindChessboard(fpath, criteria, cache, patternSize=(9, 6), squareSize=23, coarseLevels=None, fastCheck=True):
+    """
+    findChessboard backed by a CalibrationCache.ResultCache keyed by the image content and board spec
+
+    Returns:    corners (np.ndarray or None):   refined corners, None if the board was not found
+                imageSize (tuple):              image size (w, h)
+    """
+    params = {
+        "version": 2,
+        "patternSize": tuple(patternSize),
+        "squareSize": squareSize,
+        "coarseLevels": coarseLevels,
+        "fastCheck": fastCheck,
+        "criteria": tuple(criteria),
+    }
+    key = cache.key(fpath, params)
+    entry = cache.get(key)
+    if entry is not None:
+        corners = None if entry["corners"] is None else np.array(entry["corners"], dtype=np.float32).reshape(-1, 1, 2)
+        return corners, tuple(entry["imageSize"])
+
+    corners, imageSize = findChessboard(fpath, criteria, patternSize, coarseLevels, fastCheck=fastCheck)
+    cache.put(key, {"corners": None if corners is None else corners.reshape(-1, 2).tolist(),
+                    "imageSize": [int(imageSize[0]), int(imageSize[1])]})
+    return corners, imageSize
+
+def selectCalibrationViews(objPts, imgPts, imageSize, maxViews, patternSize=(9, 6), gridSize=(16, 12),
+                           diversityWeight=0.5):
+    """
+    Greedily selects a compact subset of chessboard views for intrinsic calibration, trading off
+    image coverage (cells of a grid over the image covered by the board) against pose diversity
+    (rotation angle to the closest view already selected)
+
+    Arguments:  objPts (list[np.ndarray]):      object points of each view
+                imgPts (list[np.ndarray]):      image points of each view
+                imageSize (tuple):              image size (w, h)
+                maxViews (int):                 number of views to select
+                patternSize (tuple):            inner corners per chessboard row and column
+                gridSize (tuple):               coverage grid columns and rows
+                diversityWeight (float):        weight of pose diversity relative to coverage gain
+
+    Returns:    selected (list[int]):           indices of the selected views, in selection order
+                stats (dict):                   "coverage" and "coverageAll": fraction of grid cells covered
+                                                by the selected and by all views, "minAngle" and "meanAngle":
+                                                closest and mean pairwise rotation angle between selected views (deg)
+    """
+    n = len(imgPts)
+    w, h = imageSize
+    cols, rows = patternSize
+
+    # Coverage of each view: grid cells inside the board outline
+    outline = [0, cols - 1, cols * rows - 1, cols * (rows - 1)]
+    scale = np.array([gridSize[0] / w, gridSize[1] / h])
+    cells = np.zeros((n, gridSize[1] * gridSize[0]), dtype=bool)
+    for i in range(n):
+        cell = np.zeros((gridSize[1], gridSize[0]), dtype=np.uint8)
+        corners = np.round(imgPts[i].reshape(-1, 2)[outline] * scale).astype(np.int32)
+        cv2.fillConvexPoly(cell, corners, 1)
+        cells[i] = cell.ravel() > 0
+
+    # Approximate board orientation of each view
+    camMtx = cv2.initCameraMatrix2D(objPts, imgPts, imageSize)
+    rotations = np.empty((n, 3, 3))
+    for i in range(n):
+        ok, rvec, tvec = cv2.solvePnP(objPts[i], imgPts[i], camMtx, None)
+        rotations[i] = cv2.Rodrigues(rvec)[0]
+    cosAngle = (np.einsum('iab,jab->ij', rotations, rotations) - 1) / 2
+    angles = np.arccos(np.clip(cosAngle, -1, 1))
+
+    selected = [int(np.argmax(cells.sum(axis=1)))]
+    covered = cells[selected[0]].copy()
+    available = np.ones(n, dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < min(maxViews, n):
+        gain = (cells & ~covered).sum(axis=1) / covered.size
+        diversity = np.minimum(angles[:, selected].min(axis=1) / (np.pi / 2), 1)
+        score = np.where(available, gain + diversityWeight * diversity, -np.inf)
+        best = int(np.argmax(score))
+        selected.append(best)
+        covered |= cells[best]
+        available[best] = False
+
+    pairwise = angles[np.ix_(selected, selected)][np.triu_indices(len(selected), 1)]
+    stats = {
+        "coverage": covered.mean(),
+        "coverageAll": cells.any(axis=0).mean(),
+        "minAngle": np.degrees(pairwise.min()) if len(pairwise) > 0 else 0.0,
+        "meanAngle": np.degrees(pairwise.mean()) if len(pairwise) > 0 else 0.0,
+    }
+    return selected, stats
+
+def calibrationRms(objPts, imgPts, intMtx, distCoeffs):
+    """RMS reprojection error (px) of chessboard views under given intrinsics, each view posed by cv2.solvePnP"""
+    sqErrs = []
+    for obj, img in zip(objPts, imgPts):
+        ok, rvec, tvec = cv2.solvePnP(obj, img, intMtx, distCoeffs)
+        px = cv2.projectPoints(obj, rvec, tvec, intMtx, distCoeffs)[0]
+        sqErrs.append(np.sum((px.reshape(-1, 2) - img.reshape(-1, 2)) ** 2, axis=1))
+    return float(np.sqrt(np.mean(np.concatenate(sqErrs))))
+
+def distortionCalibration(chessboardFiles, workers=None, undistortedDir=None, coarseLevels=None, fastCheck=True,
+                          cornerCacheFile=None, intMtxGuess=None, distCoeffsGuess=None, guessImageSize=None,
+                          maxViews=None, maxRmsIncrease=0.01, returnInfo=False):
     """
     Runs intrinsic calibration on a set of chessboard image files
 
     Arguments:  chessboardFiles (list [str]):   list of chessboard image file names
+                workers (int):                  number of corner detection threads, os.cpu_count() if None
+                undistortedDir (str):           if given, undistorted copies of the images are written there
+                coarseLevels (int):             pyramid levels for the coarse board search, automatic if None
+                fastCheck (bool):               quickly reject images without a board
+                cornerCacheFile (str):          if given, per-image corners are cached in this file and only
+                                                new or changed images are searched again
+                intMtxGuess (np.ndarray, 3x3):  previous intrinsic matrix to warm-start calibrateCamera from
+                distCoeffsGuess (np.ndarray, 1x5):  previous distortion coefficients for the warm start
+                guessImageSize (tuple):         image size (w, h) the guess was calibrated at; the guess is only
+                                                used if it matches the size of the chessboard images
+                maxViews (int):                 if given, also calibrate on at most this many views chosen by
+                                                selectCalibrationViews for coverage and pose diversity, and
+                                                return that calibration if it is no less accurate on all views
+                maxRmsIncrease (float):         relative increase of the RMS reprojection error over all views
+                                                up to which the calibration on the selected views is accepted
+                returnInfo (bool):              if True, also return a dict of details about the run
 
     Returns:    intMtx (np.ndarray, 3x3):       camera intrinsic matrix
                 distCoeffs (np.ndarray, 1x5):   camera distortion coefficients
+                info (dict):                    (only if returnInfo) "imageSize": image size (w, h),
+                                                "warmStart": whether the guess was used, "rms": RMS
+                                                reprojection error of the calibration (px), "views": None
+                                                without maxViews, else the selectCalibrationViews stats with
+                                                "selected": indices of the selected views, "rmsAll": RMS
+                                                error over all views of the calibration on the selected
+                                                views (px), "accepted": whether that calibration was returned
     """
     # Termination criteria
     criteria = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
@@ -218,194 +1335,163 @@ def distortionCalibration(chessboardFiles):
     # Arrays to store object and image points from images
     objPts = [] # 3D points (world space)
     imgPts = [] # 2D points (image plane)
-    
-    n = len(chessboardFiles)
-    for count in range(n):
-        fpath = chessboardFiles[count]
-        img = cv2.imread(fpath)
 
-        #img = img[0,::-1,::-1,:] # may be unnecessary with sksurg preprocessing (compared to slicer)
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
-        # Find checkerboard corners
-        ret, corners = cv2.findChessboardCorners(gray, (9, 6), None)
-        # If found, refine and add image and object points
-        if ret:
+    # Corner extraction fanned out over a worker pool, gathered in file order
+    if cornerCacheFile is None:
+        find = lambda fpath: findChessboard(fpath, criteria, coarseLevels=coarseLevels, fastCheck=fastCheck)
+    else:
+        cornerCache = CalibrationCache.ResultCache(cornerCacheFile)
+        find = lambda fpath: cachedFindChessboard(fpath, criteria, cornerCache, coarseLevels=coarseLevels,
+                                                  fastCheck=fastCheck)
+    for corners, imageSize in orderedMap(find, chessboardFiles, workers):
+        # If found, add image and object points
+        if corners is not None:
             objPts.append(objp)
-            corners2 = cv2.cornerSubPix(gray, corners, (11, 11), (-1, -1), criteria)
             imgPts.append(corners)
+    if cornerCacheFile is not None:
+        cornerCache.save()
+        print(f"Corner cache: {cornerCache.hits} hits, {cornerCache.misses} misses")
+
+    warmStart = intMtxGuess is not None
+    if warmStart and (guessImageSize is None or tuple(guessImageSize) != tuple(imageSize)):
+        # A guess from another camera or resolution would start LM from a wrong focal length and principal point
+        print(f"Intrinsic guess is for image size {guessImageSize}, not {tuple(imageSize)}; calibrating from scratch")
+        warmStart = False
+
+    def calibrate(objPts, imgPts):
+        if warmStart:
+            # Warm start from the previous intrinsics
+            distGuess = np.zeros((1, 5)) if distCoeffsGuess is None else np.array(distCoeffsGuess, dtype=np.float64)
+            return cv2.calibrateCamera(objPts, imgPts, imageSize, np.array(intMtxGuess, dtype=np.float64), distGuess,
+                                       flags=cv2.CALIB_USE_INTRINSIC_GUESS)[:3]
+        return cv2.calibrateCamera(objPts, imgPts, imageSize, None, None)[:3]
+
+    ret, intMtx, distCoeffs = calibrate(objPts, imgPts)
+
+    views = None
+    if maxViews is not None and len(imgPts) > maxViews:
+        selected, stats = selectCalibrationViews(objPts, imgPts, imageSize, maxViews)
+        print(f"Selected {len(selected)} views: coverage {stats['coverage']:.2f} (all views {stats['coverageAll']:.2f}), "
+              f"min/mean pairwise rotation {stats['minAngle']:.1f}/{stats['meanAngle']:.1f} deg")
+
+        # The subset is only kept if its intrinsics reproject all views about as well as the solve on all views
+        subsetRet, subsetIntMtx, subsetDistCoeffs = calibrate([objPts[i] for i in selected],
+                                                              [imgPts[i] for i in selected])
+        rmsAll = calibrationRms(objPts, imgPts, subsetIntMtx, subsetDistCoeffs)
+        accepted = rmsAll <= ret * (1 + maxRmsIncrease)
+        print(f"Selected views reproject all views with RMS {rmsAll:.4f} px, all views {ret:.4f} px: "
+              f"{'using the selected views' if accepted else 'using all views'}")
+        if accepted:
+            ret, intMtx, distCoeffs = subsetRet, subsetIntMtx, subsetDistCoeffs
+        views = dict(stats, selected=selected, rmsAll=rmsAll, accepted=accepted)
 
-            # Draw corners
-            cornersdrawn = cv2.drawChessboardCorners(img, (9, 6), corners2, ret)
-            
-            # cv2.imshow(fpath[-13:], cornersdrawn)
-            # cv2.waitKey(0)
-            # Save drawn image if necessary?
-    shp = gray.shape[::-1]
-
-    ret, intMtx, distCoeffs, rvecs, tvecs = cv2.calibrateCamera(objPts, imgPts, gray.shape[::-1], None, None)
     print("distortion coefficients:", distCoeffs)
-    for count in range(n):
-        img = cv2.imread(chessboardFiles[count])
-        #img = img[0,::-1,::-1,:] # may be unnecessary with sksurg preprocessing (compared to slicer)
-        
-        # Undistort
-        h, w = img.shape[:2]
-        newCameraMtx, roi = cv2.getOptimalNewCameraMatrix(intMtx, distCoeffs, (w, h), 1, (w, h))
-        img = cv2.undistort(img, intMtx, distCoeffs, None, newCameraMtx)
-        # Save raw undistorted image if necessary?
+
+    # Save raw undistorted images if requested
+    if undistortedDir is not None:
+        os.makedirs(undistortedDir, exist_ok=True)
+        def undistortFile(fpath):
+            img, newCameraMtx = Undistortion.undistortImage(cv2.imread(fpath), intMtx, distCoeffs)
+            cv2.imwrite(f"{undistortedDir}/{os.path.basename(fpath)}", img)
+        for _ in orderedMap(undistortFile, chessboardFiles, workers):
+            pass
 
     # Add the obtained intrinsic matrix and distortion coefficients to the UI
     print("intMtx:", intMtx)
     print("distCoeffs:", distCoeffs)
+    if returnInfo:
+        return intMtx, distCoeffs, {"imageSize": tuple(imageSize), "warmStart": warmStart, "rms": ret, "views": views}
     return intMtx, distCoeffs
 
+def validateCalibration(extMtx, pts3D, pts2D, intMtx, percentiles=(50, 90, 95)):
+    """
+    Validates hand-eye calibration by finding pixel, distance and angular errors of all points
+    in one pass
+
+    Arguments:  extMtx (4x4):       extrinsic calibration matrix
+                pts3D (3xn):        3D tracker coordinates
+                pts2D (2xn):        2D image pixel coordinates
+                intMtx (3x3):       intrinsic camera matrix
+                percentiles:        percentiles to report in the summary
+
+    Returns:    result (dict):      "px" (2xn): reprojected pixels (i.e. from 3D points),
+                                    "pxErrs", "distErrs", "angularErrs" (nx1): pixel (px), distance (mm)
+                                    and angular (deg) errors,
+                                    "summary": for each error, a dict of "mean", "max" and "p<percentile>"
+    """
+    pts3D = np.asarray(pts3D, dtype=float)
+    pts2D = np.asarray(pts2D, dtype=float)
+
+    # Register 3D pts to camera space
+    camPts = extMtx[0:3, 0:3] @ pts3D + extMtx[0:3, 3:4]
+
+    # Project points onto image using intrinsic matrix
+    px = intMtx[0:2, 0:2] @ (camPts[0:2] / camPts[2]) + intMtx[0:2, 2:3]
+    pxErrs = np.linalg.norm(px - pts2D, axis=0)
+
+    # Angle between each point and the line of sight through its pixel
+    rays = np.linalg.solve(intMtx, np.vstack((pts2D, np.ones(pts2D.shape[1]))))
+    mags = np.linalg.norm(camPts, axis=0)
+    cosAngle = np.einsum('ij,ij->j', camPts, rays) / (mags * np.linalg.norm(rays, axis=0))
+    angles = np.arccos(np.clip(cosAngle, -1, 1))
+    distErrs = mags * np.tan(angles)
+    angularErrs = np.degrees(angles)
+
+    return {
+        "px": px,
+        "pxErrs": pxErrs.reshape(-1, 1),
+        "distErrs": distErrs.reshape(-1, 1),
+        "angularErrs": angularErrs.reshape(-1, 1),
+        "summary": summarizeErrors(pxErrs, distErrs, angularErrs, percentiles),
+    }
+
+def summarizeErrors(pxErrs, distErrs, angularErrs, percentiles=(50, 90, 95)):
+    """Mean, max and percentiles of pixel, distance and angular errors, keyed by error name"""
+    summary = {}
+    for name, errs in (("pxErrs", pxErrs), ("distErrs", distErrs), ("angularErrs", angularErrs)):
+        summary[name] = {"mean": float(np.mean(errs)), "max": float(np.max(errs))}
+        for p, value in zip(percentiles, np.percentile(errs, percentiles)):
+            summary[name][f"p{p}"] = float(value)
+    return summary
+
 def PixelValidation(extMtx, pts3D, pts2D, intMtx):
     """
-    Validates hand-eye calibration by finding pixel error
+    Validates hand-eye calibration by finding pixel error (see validateCalibration)
 
     Arguments:  extMtx (4x4):   extrinsic calibration matrix
-                pts3D (nx3):    3D tracker coordinates
-                pts2D (nx2):    2D image pixel coordinates
+                pts3D (3xn):    3D tracker coordinates
+                pts2D (2xn):    2D image pixel coordinates
                 intMtx (3x3):   intrinsic camera matrix
 
-    Returns:    pxs (nx2):      reprojected pixels (i.e. from 3D points)
-                pxErrs (n,):    vector of pixel errors
-    """
-    proj_pxs = []
-    pxErrs = []
-    n = pts3D.shape[1]
-    for k in range(n):
-        # Make 3D pt into column vector
-        pt = pts3D[:, k]
-        pt = np.reshape(pt, (3, 1))
-
-        # Make 2D pixel into column vector
-        px = pts2D[:, k]
-        px = np.reshape(px, (2, 1))
-
-        pt = np.vstack((pt, 1))
-        
-        # Register 3D pt to line
-        camPt = extMtx @ pt
-
-        # Convert 3D pt to homogeneous coordinates
-        camPt /= camPt[2]
-        camPt = camPt[0:2, :]
-        camPt = np.vstack((camPt, 1))
-
-        # Project point onto image using intrinsic matrix
-        proj_px = intMtx @ camPt
-        proj_pxs.append(proj_px)
-
-        xErr = abs(proj_px[0, 0] - px[0, 0])
-        yErr = abs(proj_px[1, 0] - px[1, 0])
-        print("proj_px[0, 0]:", proj_px[0, 0])
-        print("px[0, 0]:", px[0, 0])
-        print("xErr:", xErr)
-
-        print("proj_px[1, 0]:", proj_px[1, 0])
-        print("px[1, 0]:", px[1, 0])
-        print("yErr:", yErr)
-
-        pxErrs.append(np.sqrt(xErr * xErr + yErr * yErr))
-    pxErrs = np.reshape(pxErrs, (n, 1))
-    return proj_pxs, pxErrs
+    Returns:    pxs (list[3x1]):    reprojected pixels (i.e. from 3D points), homogeneous
+                pxErrs (nx1):   vector of pixel errors
+    """
+    result = validateCalibration(extMtx, pts3D, pts2D, intMtx)
+    px = np.vstack((result["px"], np.ones(result["px"].shape[1])))
+    return [px[:, k:k + 1] for k in range(px.shape[1])], result["pxErrs"]
 
 def DistanceValidation(extMtx, pts3D, pts2D, intMtx):
     """
-    Validates hand-eye calibration by finding distance error
+    Validates hand-eye calibration by finding distance error (see validateCalibration)
 
     Arguments:  extMtx (4x4):   extrinsic calibration matrix
                 pts3D (3xn):    3D tracker coordinates
                 pts2D (2xn):    2D image pixel coordinates
                 intMtx (3x3):   intrinsic camera matrix
 
-    Returns:    distErrs (n,):  vector of distance errors
+    Returns:    distErrs (nx1): vector of distance errors
     """
-    n = pts3D.shape[1]
-    e = np.ones((n,))
-    pts2D = np.linalg.inv(intMtx) @ np.vstack((pts2D, e))
-    Y = np.empty((3, n))
-    for i in range(n):
-        x = pts2D[:, i]
-        y = np.linalg.norm(x)
-        z = x / y
-        Y[:, i] = z
-
-    pts2D = Y
-
-    # Transform optical point to camera space
-    pts3D = extMtx @ np.vstack((pts3D, e))
-
-    # Store point magnitudes
-    mags = np.empty((n, 1))
-    for i in range(n):
-        mags[i, 0] = np.sqrt(pts3D[0, i] * pts3D[0, i] + pts3D[1, i] * pts3D[1, i] + pts3D[2, i] * pts3D[2, i])
-    
-    # Normalize vector
-    Y = np.empty((4, n))
-    for i in range(n):
-        x = pts3D[:, i]
-        y = np.linalg.norm(x)
-        z = x / y
-        Y[:, i] = z
-    pts3D = Y
-
-    distErrs = np.empty((n, 1))
-    for i in range(n):
-        x = pts3D[0:3, i]
-        q = pts2D[:, i]
-
-        rot_axis = np.cross(x, q) / np.linalg.norm(np.cross(x, q))
-        rot_angle = np.arccos(np.dot(x, q) / (np.linalg.norm(x) * np.linalg.norm(q)))
-        R = np.hstack((rot_axis, rot_angle))
-
-        angle = rot_angle
-        distErrs[i, 0] = mags[i, 0] * np.tan(angle)
-    return distErrs
+    return validateCalibration(extMtx, pts3D, pts2D, intMtx)["distErrs"]
 
 def AngularValidation(extMtx, pts3D, pts2D, intMtx):
     """
-    Validates hand-eye calibration by finding distance error
+    Validates hand-eye calibration by finding angular error (see validateCalibration)
 
     Arguments:  extMtx (4x4):   extrinsic calibration matrix
                 pts3D (3xn):    3D tracker coordinates
                 pts2D (2xn):    2D image pixel coordinates
                 intMtx (3x3):   intrinsic camera matrix
 
-    Returns:    angularErrs (n,):   vector of angular errors
+    Returns:    angularErrs (nx1):  vector of angular errors
     """
-    n = pts3D.shape[1]
-    e = np.ones((n,))
-    pts2D = np.linalg.inv(intMtx) @ np.vstack((pts2D, e))
-    Y = np.empty((3, n))
-    for i in range(n):
-        x = pts2D[:, i]
-        y = np.linalg.norm(x)
-        z = x / y
-        Y[:, i] = z
-    pts2D = Y
-
-    # Transform optical point to camera space
-    pts3D = extMtx @ np.vstack((pts3D, e))
-
-    # Normalize vector
-    Y = np.empty((4, n))
-    for i in range(n):
-        x = pts3D[:, i]
-        y = np.linalg.norm(x)
-        z = x / y
-        Y[:, i] = z
-    pts3D = Y
-
-    angularErrs = np.empty((n, 1))
-    for i in range(n):
-        x = pts3D[0:3, i]
-        q = pts2D[:, i]
-
-        rot_axis = np.cross(x, q) / np.linalg.norm(np.cross(x, q))
-        rot_angle = np.arccos(np.dot(x, q) / (np.linalg.norm(x) * np.linalg.norm(q)))
-        R = np.hstack((rot_axis, rot_angle))
-        angularErrs[i, 0] = np.degrees(rot_angle)
-
-    return angularErrs
\ No newline at end of file
+    return validateCalibration(extMtx, pts3D, pts2D, intMtx)["angularErrs"]
@@ -1,9 +1,26 @@
 from sksurgeryutils.common_overlay_apps import OverlayBaseWidget
 import cv2
+import Undistortion
+
+from RenderScheduler import RenderScheduler
+from VideoAcquisition import VideoAcquisition
+
+# Above the camera rate, so video frames are never held back and only extra tracking-driven renders are coalesced
+OVERLAY_RENDER_FPS = 60
+
+# How often update_view polls for the newest video frame; twice the usual camera rate keeps frame age low
+VIDEO_POLL_RATE = 60
+
 # Defines video feed widget with VTK overlay
 class OverlayApp(OverlayBaseWidget):
     def __init__(self, video_source: int, parentViewer):
         super().__init__(video_source)
+
+        # Frames are grabbed and undistorted on a background thread; update_view shows only the newest
+        self.videoAcquisition = VideoAcquisition(self.video_source.source)
+        self.frameTime = None
+        self.update_rate = VIDEO_POLL_RATE
+
         self.open_camera_settings()
         self.video_source.source.set(cv2.CAP_PROP_FOCUS, 0)
         #self.setSizePolicy(QtWidgets.QSizePolicy.Policy.Fixed, QtWidgets.QSizePolicy.Policy.Fixed)
@@ -15,24 +32,51 @@ class OverlayApp(OverlayBaseWidget):
         self.intMat = None
         self.distCoeffs = None
         self.newCamMat = None
+        self.cacheDir = None
+
+        # Coalesces renders from new video frames and from tracking updates of overlaid objects
+        self.renderScheduler = RenderScheduler(self.render_overlay, OVERLAY_RENDER_FPS)
+
+    def start(self):
+        """Starts video capture and display"""
+        self.videoAcquisition.start()
+        super().start()
+
+    def stop(self):
+        """Stops video capture and display; the capture thread is joined before the base widget stops"""
+        self.videoAcquisition.stop()
+        super().stop()
+
     def update_view(self):
         """
-        Reads and displays video frames
+        Displays the newest video frame, if one arrived since the last call
         """
-        _, image = self.video_source.read()
-        if self.newCamMat is not None:
-            image = cv2.undistort(image, self.intMat, self.distCoeffs, None, self.newCamMat)
-        self.vtk_overlay_window.set_video_image(image)
-        self.vtk_overlay_window.Render()
-        
+        image, frameTime = self.videoAcquisition.latestFrame()
+        if image is not None:
+            self.frameTime = frameTime
+            self.vtk_overlay_window.set_video_image(image)
+            self.renderScheduler.request()
+        else:
+            self.renderScheduler.flush()
+
         # Handles image capture flag and calls capture method
-        if self.parentViewer.capture:
+        if self.parentViewer.capture and self.frameTime is not None:
             self.parentViewer.capture = False
-            self.parentViewer.handleCapture(self.get_output_frame())
+            self.renderScheduler.flush(force=True)
+            self.parentViewer.handleCapture(self.get_output_frame(), self.frameTime)
+
+    def render_overlay(self):
+        """Renders video and overlaid VTK objects (called by renderScheduler)"""
+        self.vtk_overlay_window.foreground_renderer.ResetCameraClippingRange()
+        self.vtk_overlay_window.Render()
 
     def open_camera_settings(self):
         """Opens camera's own settings software in a new window"""
-        self.video_source.source.set(cv2.CAP_PROP_SETTINGS, 1)
+        self.videoAcquisition.setProperty(cv2.CAP_PROP_SETTINGS, 1)
+
+    def video_stats(self):
+        """Capture FPS, processing (display) FPS, age of the displayed frame in ms, and dropped stale frames"""
+        return self.videoAcquisition.stats()
 
     def get_output_frame(self):
         """
@@ -44,15 +88,18 @@ class OverlayApp(OverlayBaseWidget):
         return output_frame
     
     def closeEvent(self, QCloseEvent) -> None:
-        """Handles window close"""
-        super().closeEvent(QCloseEvent)
+        """Handles window close, stopping the capture thread before the widget is torn down"""
         self.stop()
+        super().closeEvent(QCloseEvent)
 
-    def set_camera_matrix(self, intMat, distCoeffs):
+    def set_camera_matrix(self, intMat, distCoeffs, cacheDir=None):
         """Uses intrinsic matrix and distortion coefficients to undistort frames of video stream"""
         w = self.width()
         h = self.height()
         
         self.intMat = intMat
         self.distCoeffs = distCoeffs
-        self.newCamMat, roi = cv2.getOptimalNewCameraMatrix(self.intMat, self.distCoeffs, (w, h), 1, (w, h))
\ No newline at end of file
+        self.cacheDir = cacheDir
+        map1, map2, self.newCamMat = Undistortion.getUndistortMaps(self.intMat, self.distCoeffs, (w, h),
+                                                                   cacheDir=self.cacheDir)
+        self.videoAcquisition.setUndistortion(self.intMat, self.distCoeffs, self.cacheDir)
\ No newline at end of file
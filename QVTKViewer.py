@@ -1,6 +1,7 @@
 import vtk
 import cv2
 import os
+import time
 import Stats
 
 import numpy as np
@@ -12,10 +13,24 @@ from vtkMainWindow_ui import Ui_MainWindow
 from vtk.qt.QVTKRenderWindowInteractor import QVTKRenderWindowInteractor
 from sksurgerynditracker.nditracker import NDITracker
 
+from concurrent.futures import ThreadPoolExecutor
+
 from OverlayApp import OverlayApp
+from TrackerAcquisition import TrackerAcquisition
+from RenderScheduler import RenderScheduler
 
 SPHERE_RADIUS = 15
 NUM_TRACKING_FRAMES = 40
+READOUT_WINDOW = 8
+# Tracker noise floor of the readout estimators' scale: positions (mm), then rotation elements
+READOUT_MIN_SCALE = np.array([0.1] * 3 + [0.002] * 9)
+DISPLAY_INTERVAL_MS = 16
+CAPTURE_TIMEOUT_S = 2.0
+TRACKER_RENDER_FPS = 30
+RENDER_TOLERANCE = 0.01
+CAPTURE_POLL_MS = 10
+# Tracker periods beyond the averaging half-window a capture's tracking frames may be from its video frame
+CAPTURE_GAP_FRAMES = 3
 NUM_PORTS = 2
 PORT_STYLUS = 0
 PORT_CAMERA = 1
@@ -41,8 +56,20 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
 
         # Tracker setup
         self.tracker = None
+        self.trackerAcquisition = None
+        self.trackerFrameCount = 0
         self.trackerTimer = QtCore.QTimer()
         self.isTrackerInitialized = False
+
+        # Tracker view renders only on change, at most TRACKER_RENDER_FPS; render rates shown in the status bar
+        self.trackerRenderScheduler = RenderScheduler(self.renderTrackerView, TRACKER_RENDER_FPS, RENDER_TOLERANCE)
+        self.trackerToolStatus = None
+        self.trackingQuality = None
+        # Stylus tip and camera tool positions shown on the LCDs
+        self.readoutPositions = np.zeros((2, 3))
+        self.renderStatsTimer = QtCore.QTimer()
+        self.renderStatsTimer.timeout.connect(self.showRenderStats)
+        self.renderStatsTimer.start(1000)
         self.trackerSettings = {}
 
         # Tracker widget status graphic setup
@@ -67,9 +94,28 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
         self.styTrackingCaptures = []
         self.camTrackingCaptures = []
         self.singleCaptureButton = self.captureMsg.addButton("Capture", QtWidgets.QMessageBox.ActionRole)
+        self.finishCaptureButton = self.captureMsg.addButton("Finish", QtWidgets.QMessageBox.AcceptRole)
         self.captureSequenceIdx = 0
         self.captureSequenceDir = ""
 
+        self.captureFrameTimes = {}
+
+        # Streaming robust pose estimates (position + rotation elements) for live readouts; the trend
+        # keeps them from lagging behind a moving tool
+        self.styReadoutEstimator = Stats.StreamingRobustEstimator(12, READOUT_WINDOW, minScale=READOUT_MIN_SCALE,
+                                                                  trend=True)
+        self.camReadoutEstimator = Stats.StreamingRobustEstimator(12, READOUT_WINDOW, minScale=READOUT_MIN_SCALE,
+                                                                  trend=True)
+
+        # Online hand-eye estimate updated as captures arrive; stylus tips are detected on a worker thread
+        self.onlineHandEye = None
+        self.onlineIntMat = None
+        self.onlineDistCoeffs = None
+        self.pendingCaptures = {}
+        self.onlineDetectionPool = ThreadPoolExecutor(max_workers=1)
+        self.onlineSequence = 0
+        self.captureDialogIdx = None
+
         # Pivot calibration setup
         self.minimizer = vtk.vtkAmoebaMinimizer()
         self.pivotCalArray = vtk.vtkDoubleArray()
@@ -223,81 +269,192 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
         self.intCalField.setText(fname)
         intmat, distcoeffs = cio.readIntCalFromXml(fname)
 
-    def handleCapture(self, frame):
+    def handleCapture(self, frame, frameTime=None):
         """ Receives screenshot as NumPy array and writes it to specified directory"""
         if self.captureSequenceIdx > 0:
             fname = f"{self.captureSequenceDir}/capture_{self.captureSequenceIdx}.png"
         else:
             fname, d = QtWidgets.QFileDialog.getSaveFileName(self, "Save File", QtCore.QDir.currentPath(), "PNG (*.png)")
         cv2.imwrite(fname, frame)
+        if self.captureSequenceIdx > 0:
+            self.captureFrameTimes[self.captureSequenceIdx] = frameTime
+            self.pendingCaptures.setdefault(self.captureSequenceIdx, {})["frame"] = fname
+            self.updateOnlineHandEye(self.captureSequenceIdx)
 
     def startCaptureSeq(self):
         """ Starts sequence of capturing simultaneous image and tracking data """
         numCaptures = self.numCapturesBox.value()
         self.captureSequenceDir = QtWidgets.QFileDialog.getExistingDirectory(self, "Choose Capture Output Directory")
+
+        # The online estimate needs the intrinsic calibration to undistort and detect on each capture
+        self.onlineHandEye = None
+        self.onlineSequence += 1
+        self.pendingCaptures = {}
+        self.onlineIntMat = self.onlineDistCoeffs = None
+        if os.path.isfile(self.intCalField.text()):
+            self.onlineIntMat, self.onlineDistCoeffs = cio.readIntCalFromXml(self.intCalField.text())
+
         for i in range(numCaptures):
-            self.captureMsg.setText(f"Image and Tracking Data Capture #{i+1}\nPress Capture button when ready")
+            self.captureDialogIdx = i
+            self.captureMsg.setText(self.captureMsgText(i))
+            # A collection still running for a dismissed dialog is dropped (see collectCaptureTracking)
+            self.singleCaptureButton.setEnabled(True)
+            self.finishCaptureButton.setEnabled(self.onlineHandEye is not None and self.onlineHandEye.isStable)
             self.singleCaptureButton.disconnect(None, None, None)
             self.singleCaptureButton.clicked.connect(lambda: self.singleCapture(i))
             self.captureMsg.exec()
+            if self.captureMsg.clickedButton() == self.finishCaptureButton:
+                print(f"Hand-eye estimate stable, capture sequence finished after {i} captures")
+                break
+        self.captureDialogIdx = None
         cio.writeTrackingToXml(f"{self.captureSequenceDir}/stylus_tracking_captures.xml", self.styTrackingCaptures)
         cio.writeTrackingToXml(f"{self.captureSequenceDir}/camera_tracking_captures.xml", self.camTrackingCaptures)
         self.captureSequenceIdx = 0
 
+    def captureMsgText(self, i):
+        """Prompt of the capture dialog for capture i"""
+        return f"Image and Tracking Data Capture #{i+1}\nPress Capture button when ready{self.onlineHandEyeStatus()}"
+
     def singleCapture(self, i):
-        """Captures one image screenshot with corresponding tracking data"""
+        """Captures one image screenshot; its tracking data is collected by collectCaptureTracking"""
         self.captureSequenceIdx = i + 1
+        self.captureFrameTimes.pop(i + 1, None)
 
-        # Screenshot
+        # Screenshot, which reaches handleCapture with the time its video frame was grabbed
         self.captureFrame()
 
-        progressDialog = QtWidgets.QProgressDialog("Collecting...", "Cancel", 0, NUM_TRACKING_FRAMES, self)
-        progressDialog.setMinimumDuration(0)
-        progressDialog.setWindowModality(QtCore.Qt.WindowModal)
-        sty_pts = []
-        sty_rotations = []
-        cam_pts = []
-        cam_rotations = []
-
-        # Collects positional and rotational tracking data for camera and stylus over NUM_TRACKING_FRAMES
-        for j in range(NUM_TRACKING_FRAMES):
-            progressDialog.setValue(j)
-            styPos = self.tipTransform.GetPosition()
-            camPos = self.camTransform.GetPosition()
-            if not np.isnan(np.sum(styPos)) and not np.isnan(np.sum(camPos)):
-                sty_pts.append(styPos)
-                cam_pts.append(camPos)
-                styRotMat = self.tipTransform.GetMatrix()
-                camRotMat = self.camTransform.GetMatrix()
-                styRot = np.empty((9))
-                camRot = np.empty((9))
-                for k in range(3):
-                   for l in range(3):
-                       styRot[int(k*l+l)] = styRotMat.GetElement(k, l)
-                       camRot[int(k*l+l)] = camRotMat.GetElement(k, l)
-                sty_rotations.append(styRot)
-                cam_rotations.append(camRot)
-        progressDialog.setValue(NUM_TRACKING_FRAMES)
-        sty_rotations = np.array(sty_rotations)
-        cam_rotations = np.array(cam_rotations)
-
-        # Averages 3D positional tracking data across NUM_TRACKING_FRAMES
-        sty_avgPos = Stats.robustAverage3D(np.array(sty_pts))
-        cam_avgPos = Stats.robustAverage3D(np.array(cam_pts))
-
-        # Averages rotational tracking data across NUM_TRACKING_FRAMES
-        sty_avgRot = np.empty((3, 3))
-        cam_avgRot = np.empty((3, 3))
-        for j in range(3):
-            for k in range(3):
-                sty_avgRot[j, k] = Stats.robustAverage1D(np.array(sty_rotations[:, int(k*j+k)]))
-                cam_avgRot[j, k] = Stats.robustAverage1D(np.array(cam_rotations[:, int(k*j+k)]))
-
-        # Adds stylus and camera tracking data to respective files
-        self.styTrackingCaptures.append([sty_avgPos, sty_avgRot])
-        self.camTrackingCaptures.append([cam_avgPos, cam_avgRot])
+        if self.trackerAcquisition is None or not self.trackerAcquisition.isRunning():
+            print("Tracker is not running, no tracking data to capture")
+            return
+        # Finishing now would write the tracking files without this capture
+        self.singleCaptureButton.setEnabled(False)
+        self.finishCaptureButton.setEnabled(False)
+        self.captureMsg.setText(f"Image and Tracking Data Capture #{i+1}\nCollecting tracking data...")
+        self.collectCaptureTracking(i, time.monotonic() + CAPTURE_TIMEOUT_S, self.onlineSequence)
+
+    def collectCaptureTracking(self, i, deadline, sequence):
+        """
+        Robustly averages the NUM_TRACKING_FRAMES distinct tracker frames closest in time to the video frame of
+        capture i, once enough frames newer than it have arrived to bracket it. Until then it re-schedules itself
+        on the event loop, so the UI keeps running while tracking is acquired. Frames more than CAPTURE_GAP_FRAMES
+        tracker periods beyond the averaging window from the video frame are not used; if none are left after the
+        video frame (the tracker stalled) the capture is rejected.
+        """
+        if sequence != self.onlineSequence or self.captureDialogIdx != i:
+            # The dialog this capture was taken in has moved on or closed
+            return
+
+        frameTime = self.captureFrameTimes.get(i + 1)
+        frames = None
+        numAfter = 0
+        ready = False
+        rate = self.trackerAcquisition.buffer.rate()
+        if frameTime is not None and rate > 0:
+            maxGap = (NUM_TRACKING_FRAMES // 2 + CAPTURE_GAP_FRAMES) / rate
+            frames, numAfter = self.trackerAcquisition.buffer.around(frameTime, NUM_TRACKING_FRAMES,
+                                                                     [PORT_STYLUS, PORT_CAMERA], maxGap)
+            ready = numAfter >= NUM_TRACKING_FRAMES - NUM_TRACKING_FRAMES // 2
+        if not ready and time.monotonic() < deadline:
+            QtCore.QTimer.singleShot(CAPTURE_POLL_MS, lambda: self.collectCaptureTracking(i, deadline, sequence))
+            return
+
+        self.singleCaptureButton.setEnabled(True)
+        self.finishCaptureButton.setEnabled(self.onlineHandEye is not None and self.onlineHandEye.isStable)
+        if frames is None or len(frames["hostTimes"]) == 0 or numAfter == 0:
+            print("No tracking data collected around this capture, please capture again")
+            self.captureMsg.setText(self.captureMsgText(i))
+            return
+        if not ready:
+            print(f"Tracking frames after capture {i+1} timed out, averaging {len(frames['hostTimes'])} frames")
+
+        # Robust averages of both tools' positions and rotations, each in one batched call
+        styMats = frames["matrices"][:, PORT_STYLUS]
+        camMats = frames["matrices"][:, PORT_CAMERA]
+        tipMats = self.tipMatrices(styMats, camMats)
+        sty_avgPos, cam_avgPos = Stats.robustAverage(np.array([tipMats[:, :3, 3], camMats[:, :3, 3]]))
+        sty_avgRot, cam_avgRot = Stats.robustRotationAverage(np.array([tipMats[:, :3, :3], camMats[:, :3, :3]]))
+
+        # Adds stylus and camera tracking data, with the video frame time, to respective files
+        self.styTrackingCaptures.append([sty_avgPos, sty_avgRot, frameTime])
+        self.camTrackingCaptures.append([cam_avgPos, cam_avgRot, frameTime])
+        self.pendingCaptures.setdefault(i + 1, {})["position"] = sty_avgPos
+        self.updateOnlineHandEye(i + 1)
         self.captureMsg.accept()
 
+    def updateOnlineHandEye(self, idx):
+        """Adds capture idx to the online hand-eye estimate once both its image and its tracking data are in"""
+        capture = self.pendingCaptures.get(idx, {})
+        if "frame" not in capture or "position" not in capture:
+            return
+        del self.pendingCaptures[idx]
+        if self.onlineIntMat is None:
+            return
+
+        # Reading, undistorting and searching the image runs on the worker, off the GUI thread
+        future = self.onlineDetectionPool.submit(he.detectCircle, capture["frame"], self.onlineIntMat,
+                                                 self.onlineDistCoeffs, cacheDir=os.path.dirname(self.intCalField.text()))
+        self.addOnlineDetection(idx, capture["position"], future, self.onlineSequence)
+
+    def addOnlineDetection(self, idx, position, future, sequence):
+        """
+        Adds the stylus tip detected in capture idx to the online hand-eye estimate once the detection worker
+        is done; until then it re-schedules itself on the event loop
+        """
+        if not future.done():
+            QtCore.QTimer.singleShot(CAPTURE_POLL_MS, lambda: self.addOnlineDetection(idx, position, future, sequence))
+            return
+        if sequence != self.onlineSequence:
+            # A new capture sequence has started since
+            return
+
+        img, newCameraMtx, detection = future.result()
+        if detection is None:
+            print(f"No stylus tip found in capture {idx}, not used for the online estimate")
+            return
+        if self.onlineHandEye is None:
+            self.onlineHandEye = he.OnlineHandEye(newCameraMtx)
+        update = self.onlineHandEye.add(position, detection[0])
+        if update is not None:
+            print(f"Online estimate after {update['n']} captures: pixel error {update['pxErr']:.2f} px, "
+                  f"change {update['rotationChange']:.3f} deg / {update['translationChange']:.3f} mm")
+
+        # Refresh the waiting capture dialog, unless it is collecting tracking data for a capture
+        if self.captureDialogIdx is not None and self.singleCaptureButton.isEnabled():
+            self.captureMsg.setText(self.captureMsgText(self.captureDialogIdx))
+            self.finishCaptureButton.setEnabled(self.onlineHandEye.isStable)
+
+    def onlineHandEyeStatus(self):
+        """Describes the online hand-eye estimate for the capture dialog"""
+        if self.onlineIntMat is None:
+            return ""
+        if self.onlineHandEye is None or len(self.onlineHandEye.history) == 0:
+            return "\nOnline estimate: waiting for more captures"
+        update = self.onlineHandEye.history[-1]
+        if self.onlineHandEye.isStable:
+            status = "stable, press Finish to stop capturing"
+        elif not update["valid"]:
+            status = "invalid, points behind the camera"
+        else:
+            status = "not yet stable"
+        return (f"\nOnline estimate from {update['n']} captures: pixel error {update['pxErr']:.2f} px, "
+                f"last change {update['rotationChange']:.3f} deg / {update['translationChange']:.3f} mm ({status})")
+
+    def poseVectors(self, mats):
+        """Positions followed by the row-major rotation elements of a stack of 4x4 matrices (k x 12)"""
+        return np.concatenate((mats[:, :3, 3], mats[:, :3, :3].reshape(-1, 9)), axis=1)
+
+    def tipMatrices(self, styMats, camMats):
+        """Stylus tip poses relative to the camera tool for stacks of tracker matrices, as tipTransform computes them"""
+        pivot = self.appliedPivotCal.GetMatrix()
+        pivotMat = np.array([[pivot.GetElement(k, l) for l in range(4)] for k in range(4)])
+
+        # Rigid inverse of the camera tool poses, which keeps NaN (untracked) frames NaN
+        camInv = np.zeros_like(camMats)
+        camInv[:, :3, :3] = np.swapaxes(camMats[:, :3, :3], 1, 2)
+        camInv[:, :3, 3] = -np.einsum('kij,kj->ki', camInv[:, :3, :3], camMats[:, :3, 3])
+        camInv[:, 3, 3] = 1
+        return camInv @ styMats @ pivotMat
+
     def startTracker(self):
         """ Starts NDI Aurora (magnetic) or Polaris (optical) tracker and sets up VTK tracked objects"""
 
@@ -328,8 +485,12 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
                     self.trackerToggle.setChecked(False)
 
             if self.isTrackerInitialized:
-                self.tracker.start_tracking()
-                self.trackerTimer.start(0)
+                # Frames are acquired at the device's rate on a background thread, and drawn at display rate
+                self.trackerAcquisition = TrackerAcquisition(self.tracker, NUM_PORTS)
+                self.trackerFrameCount = 0
+                self.trackerToolStatus = None
+                self.trackerAcquisition.start()
+                self.trackerTimer.start(DISPLAY_INTERVAL_MS)
                 self.createTrackerLogo()
                 self.trackerLogoWidget.On()
                 self.ren.AddActor(self.sphereActor)
@@ -339,7 +500,7 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
         else:
             if self.isTrackerInitialized:
                 self.trackerTimer.stop()
-                self.tracker.stop_tracking()
+                self.trackerAcquisition.stop()
                 self.trackerLogoWidget.Off()
                 self.ren.RemoveActor(self.sphereActor)
                 self.ren.RemoveActor(self.stylusActor)
@@ -348,22 +509,43 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def updateTrackerInfo(self):
         """
-        Updates VTK objects, error display, and volume display with new tracking information (called as often as possible)
+        Updates VTK objects, error display, and volume display with the tracking frames acquired since the last
+        call (called at display rate)
         """
         if self.isTrackerInitialized:
-            port_handles, time_stamps, frame_numbers, tracking, tracking_quality = self.tracker.get_frame()
-
-            sty_mat = tracking[PORT_STYLUS]
-            sty_mat_16 = np.reshape(sty_mat, 16)
-
-            cam_mat = tracking[PORT_CAMERA]
-            cam_mat_16 = np.reshape(cam_mat, 16)
-
-            if self.collectPivotCalData and not np.isnan(np.sum(sty_mat_16) + np.sum(cam_mat_16)):
-                self.pivotCalArray.InsertNextTuple(sty_mat_16)
-            
-            self.styTransform.SetMatrix(sty_mat_16)
-            self.camTransform.SetMatrix(cam_mat_16)
+            frames, self.trackerFrameCount = self.trackerAcquisition.buffer.since(self.trackerFrameCount)
+            if len(frames["hostTimes"]) == 0:
+                if self.trackerAcquisition.error is not None and not self.trackerAcquisition.isRunning():
+                    self.showTrackerFailure()
+                    return
+                self.trackerRenderScheduler.flush()
+                return
+
+            styMats = frames["matrices"][:, PORT_STYLUS]
+            camMats = frames["matrices"][:, PORT_CAMERA]
+
+            if self.collectPivotCalData:
+                valid = ~np.isnan(styMats).any(axis=(1, 2)) & ~np.isnan(camMats).any(axis=(1, 2))
+                for sty_mat in styMats[valid]:
+                    self.pivotCalArray.InsertNextTuple(np.reshape(sty_mat, 16))
+
+            # Feeds every new frame to the readout estimators
+            styPoses = self.poseVectors(self.tipMatrices(styMats, camMats))
+            camPoses = self.poseVectors(camMats)
+            for styPose, camPose in zip(styPoses, camPoses):
+                self.styReadoutEstimator.add(styPose)
+                self.camReadoutEstimator.add(camPose)
+            for k, (estimator, poses) in enumerate(((self.styReadoutEstimator, styPoses),
+                                                    (self.camReadoutEstimator, camPoses))):
+                position = self.readoutPosition(estimator, poses)
+                if position is not None:
+                    self.readoutPositions[k] = position
+
+            # Displays the newest frame
+            tracking = frames["matrices"][-1]
+            tracking_quality = frames["quality"][-1]
+            self.styTransform.SetMatrix(np.reshape(tracking[PORT_STYLUS], 16))
+            self.camTransform.SetMatrix(np.reshape(tracking[PORT_CAMERA], 16))
 
             self.tipTransform.Update()
 
@@ -384,16 +566,49 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
                 my = m.GetElement(1, 3)
                 mz = m.GetElement(2, 3)
 
-                self.overlay.vtk_overlay_window.foreground_renderer.ResetCameraClippingRange()
-                self.overlay.vtk_overlay_window.GetRenderWindow().Render()
-
-
-            self.updateVolumeDisplay(tracking)
-            self.updateTrackingPositions()
-            self.updateErrorDisplay(tracking_quality)
-
-            self.ren.ResetCameraClippingRange()
-            self.qvtkwin.GetRenderWindow().Render()
+                self.overlay.renderScheduler.request(np.concatenate((tracking.ravel(), self.extMatHE.ravel())))
+
+            # Tool status icons are only redrawn when a tool is lost or found
+            toolStatus = tuple(bool(np.isnan(np.sum(trackingInfo))) for trackingInfo in tracking)
+            if toolStatus != self.trackerToolStatus:
+                self.trackerToolStatus = toolStatus
+                self.updateVolumeDisplay(tracking)
+
+            # Renders the tracker view and readouts when the poses, readouts or tracking quality changed
+            self.trackingQuality = tracking_quality
+            self.trackerRenderScheduler.request(np.concatenate((tracking.ravel(), tracking_quality,
+                                                                self.readoutPositions.ravel())))
+
+    def showTrackerFailure(self):
+        """Marks all tools as lost once the acquisition thread has died, instead of freezing on the last pose"""
+        self.trackerTimer.stop()
+        self.trackerToolStatus = (True,) * NUM_PORTS
+        self.updateVolumeDisplay(np.full((NUM_PORTS, 4, 4), np.nan))
+        self.statusbar.showMessage(f"Tracker stopped: {self.trackerAcquisition.error}")
+        self.qvtkwin.GetRenderWindow().Render()
+
+    def renderTrackerView(self):
+        """Refreshes readouts and renders the tracker view (called by trackerRenderScheduler)"""
+        self.updateTrackingPositions()
+        if self.trackingQuality is not None:
+            self.updateErrorDisplay(self.trackingQuality)
+
+        self.ren.ResetCameraClippingRange()
+        self.qvtkwin.GetRenderWindow().Render()
+
+    def showRenderStats(self):
+        """Shows achieved render rates and dropped frames of the tracker view and overlay, and video capture timing"""
+        if self.trackerAcquisition is not None and self.trackerAcquisition.error is not None:
+            # Keeps the tracker failure (see showTrackerFailure) on screen
+            return
+        tracker = self.trackerRenderScheduler.stats()
+        overlay = self.overlay.renderScheduler.stats()
+        video = self.overlay.video_stats()
+        self.statusbar.showMessage(f"Tracker view: {tracker['fps']:.0f} fps, {tracker['dropped']} dropped, "
+                                   f"{tracker['skipped']} unchanged | Overlay: {overlay['fps']:.0f} fps, "
+                                   f"{overlay['dropped']} dropped | Video: capture {video['captureFps']:.0f} fps, "
+                                   f"processing {video['processingFps']:.0f} fps, frame age {video['frameAgeMs']:.0f} ms, "
+                                   f"{video['dropped']} stale dropped")
 
     def createTrackerLogo(self):
         """Initializes rectangular icons showing tracked tool status (red = not tracking, green = tracking)"""
@@ -448,14 +663,23 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
         self.camErr.display(camErr)
         self.styErr.display(styErr)
     
+    def readoutPosition(self, estimator, poses):
+        """
+        Robust running position of a tool, or its newest raw position (poses: k x 12, see poseVectors) until the
+        estimator has warmed up; None if neither is available
+        """
+        if len(estimator) >= estimator.warmup and not np.isnan(estimator.location).any():
+            return estimator.location[:3]
+        tracked = poses[~np.isnan(poses).any(axis=1)]
+        return tracked[-1, :3] if len(tracked) > 0 else None
+
     def updateTrackingPositions(self):
-        """Updates LCDs with x, y, z coordinates of both tools from tracker"""
-        camPos = self.camTransform.GetPosition()
+        """Updates LCDs with the x, y, z readout coordinates of both tools (see readoutPosition)"""
+        styPos, camPos = self.readoutPositions
         self.camTx.display(camPos[0])
         self.camTy.display(camPos[1])
         self.camTz.display(camPos[2])
 
-        styPos = self.tipTransform.GetPosition()
         self.styTx.display(styPos[0])
         self.styTy.display(styPos[1])
         self.styTz.display(styPos[2])
@@ -595,14 +819,24 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
             chessboardFiles = []
             for file in os.listdir(dir):
                 fname = os.fsdecode(file)
-                chessboardFiles.append(f"{dir_str}/{fname}")
-
-            intMat, distCoeffs = he.distortionCalibration(chessboardFiles)
+                if fname.lower().endswith(('.png', '.jpg', '.jpeg', '.bmp', '.tif', '.tiff')):
+                    chessboardFiles.append(f"{dir_str}/{fname}")
+
+            # Warm start from the current intrinsic calibration file, if there is one for the same image size
+            intMatGuess = distCoeffsGuess = guessImageSize = None
+            if os.path.isfile(self.intCalField.text()):
+                intMatGuess, distCoeffsGuess = cio.readIntCalFromXml(self.intCalField.text())
+                guessImageSize = cio.readIntCalImageSizeFromXml(self.intCalField.text())
+
+            intMat, distCoeffs, info = he.distortionCalibration(chessboardFiles,
+                                                                cornerCacheFile=f"{dir_str}/corner_cache.json",
+                                                                intMtxGuess=intMatGuess, distCoeffsGuess=distCoeffsGuess,
+                                                                guessImageSize=guessImageSize, returnInfo=True)
             print(distCoeffs)
             fname, d = QtWidgets.QFileDialog.getSaveFileName(self, "Save XML File", QtCore.QDir.currentPath(), "XML Files (*.xml)")
-            cio.writeIntCalToXml(fname, intMat, distCoeffs)
+            cio.writeIntCalToXml(fname, intMat, distCoeffs, info["imageSize"])
 
-            self.overlay.set_camera_matrix(intMat, distCoeffs)
+            self.overlay.set_camera_matrix(intMat, distCoeffs, os.path.dirname(fname))
     
     def saveHECal(self):
         """Writes intrinsic matrix, distortion coefficients, and extrinsic matrix to XML file"""
@@ -614,14 +848,7 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
 
         # Collects captured images from given folder
         frames_dir_str = self.findHEImageField.text()
-        frames_dir = os.fsencode(frames_dir_str)
-        imageFiles = []
-        file_ctr = 0
-        for file in os.listdir(frames_dir):
-            file_str = os.fsdecode(file)
-            if file_str.endswith('.png'):
-                file_ctr += 1
-                imageFiles.append(f"{frames_dir_str}/capture_{file_ctr}.png")
+        imageFiles = he.listCaptureFrames(frames_dir_str)
 
         # Reads tracking data corresponding to calibration images
         fname = self.findHETrackingField.text()
@@ -632,7 +859,11 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
         intMat, distCoeffs = cio.readIntCalFromXml(intCalFile)
         
         # Calls registration to get extrinsic matrix, reprojection coordinates, and error values
-        extMat, px, pxErrs, distErrs, angularErrs = he.analyzeFrames(imageFiles, trackingPositions, intMat, distCoeffs)
+        cacheDir = os.path.dirname(intCalFile)
+        extMat, px, pxErrs, distErrs, angularErrs, info = he.analyzeFrames(imageFiles, trackingPositions, intMat, distCoeffs,
+                                                                           cacheDir=cacheDir,
+                                                                           detectionCacheFile=f"{frames_dir_str}/detection_cache.json",
+                                                                           returnInfo=True)
 
         print("\n")
         print("Pixels")
@@ -655,22 +886,8 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
 
         # Displays and saves images with centroid reprojection
         output_path = f"{frames_dir_str}/output"
-        os.mkdir(output_path)
-        for i in range(len(px)):
-            try:
-                img = cv2.imread(f"{frames_dir_str}/capture_{i+1}.png")
-                h, w = img.shape[:2]
-                newCamMat, roi = cv2.getOptimalNewCameraMatrix(intMat, distCoeffs, (w, h), 1, (w, h))
-                img = cv2.undistort(img, intMat, distCoeffs, None, newCamMat)
-                if px[i][0, 0] != -1:
-                    pxx = np.uint16(np.round(px[i][0, 0]))
-                    pxy = np.uint16(np.round(px[i][1, 0]))
-                    cv2.circle(img, (pxx, pxy), 1, (0, 255, 255), 2)
-                    cv2.imshow("pixel error image", img)
-                    cv2.waitKey(0)
-                    cv2.imwrite(f"{output_path}/reprojection_{i+1}.png", img)
-            except:
-                print("could not draw pixel onto image")
+        he.writeReprojectionImages(imageFiles, px, info["frameIndices"], intMat, distCoeffs, output_path, show=True,
+                                   cacheDir=cacheDir)
 
         # Writes error values to CSV file
         cio.writeErrToCsv(pxErrs, distErrs, angularErrs, output_path)
@@ -679,7 +896,7 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
         self.intMatHE = intMat
         self.distCoeffs = distCoeffs
 
-        self.overlay.set_camera_matrix(self.intMatHE, self.distCoeffs)
+        self.overlay.set_camera_matrix(self.intMatHE, self.distCoeffs, cacheDir)
 
         self.testHEToggle.setEnabled(True)
         self.saveHEButton.setEnabled(True)
@@ -692,7 +909,7 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
         self.intMatHE = intMat
         self.extMatHE = extMat
         self.distCoeffs = distCoeffs
-        self.overlay.set_camera_matrix(self.intMatHE, self.distCoeffs)
+        self.overlay.set_camera_matrix(self.intMatHE, self.distCoeffs, os.path.dirname(fname))
         print("int mat", self.intMatHE)
         print("dist coeffs", self.distCoeffs)
         print("ext mat", self.extMatHE)
@@ -747,6 +964,9 @@ class QVTKViewer(QtWidgets.QMainWindow, Ui_MainWindow):
 
     def closeEvent(self, event: QtGui.QCloseEvent) -> None:
         super().closeEvent(event)
+        if self.trackerAcquisition is not None:
+            self.trackerAcquisition.stop()
+        self.onlineDetectionPool.shutdown(wait=False, cancel_futures=True)
         self.qvtkwin.close()
         self.qvtkwin.Finalize()
         self.overlay.close()
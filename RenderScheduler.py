@@ -0,0 +1,74 @@
+import time
+import numpy as np
+
+from collections import deque
+
+class RenderScheduler:
+    """
+    Coalesces render requests for one window to at most targetFps and skips requests that do not
+    change what is drawn. A change is rendered at once if the last render is at least one frame
+    interval old; otherwise it stays pending and is drawn by the next flush() (call it from the
+    periodic timer that drives the window), so no change waits longer than one interval.
+
+    Counters:   rendered:   renders done
+                dropped:    changes merged into a later render by the rate limit
+                skipped:    requests whose state equalled the last requested state
+    """
+    def __init__(self, render, targetFps=30, tolerance=0.0, clock=time.monotonic):
+        self.render = render
+        self.interval = 1.0 / targetFps
+        self.tolerance = tolerance
+        self.clock = clock
+        self.state = None
+        self.pending = False
+        self.lastRender = -np.inf
+        self.renderTimes = deque(maxlen=120)
+        self.rendered = 0
+        self.dropped = 0
+        self.skipped = 0
+
+    def request(self, state=None):
+        """
+        Asks for a render. state (array or tuple) describes what would be drawn; if it equals the
+        last requested state (within tolerance) the request is skipped. With state None the
+        request always counts as a change. Returns True if the window was rendered now.
+        """
+        if state is not None:
+            state = np.asarray(state, dtype=float)
+            if (self.state is not None and state.shape == self.state.shape and
+                    np.allclose(state, self.state, rtol=0.0, atol=self.tolerance, equal_nan=True)):
+                self.skipped += 1
+                return self.flush()
+            self.state = state
+        if self.pending:
+            self.dropped += 1
+        self.pending = True
+        return self.flush()
+
+    def flush(self, force=False):
+        """
+        Renders a pending change if a frame interval has passed since the last render (or at once if
+        force, e.g. before the window is read back); returns True if rendered
+        """
+        if not self.pending:
+            return False
+        now = self.clock()
+        # 10% slack, so that a timer ticking at the target rate is not halved by its jitter
+        if not force and now - self.lastRender < 0.9 * self.interval:
+            return False
+        self.render()
+        self.pending = False
+        self.lastRender = now
+        self.renderTimes.append(now)
+        self.rendered += 1
+        return True
+
+    def fps(self):
+        """Achieved render rate over the last second"""
+        now = self.clock()
+        recent = [t for t in self.renderTimes if now - t <= 1.0]
+        return float(len(recent))
+
+    def stats(self):
+        """Achieved FPS and counters"""
+        return {"fps": self.fps(), "rendered": self.rendered, "dropped": self.dropped, "skipped": self.skipped}
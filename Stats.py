@@ -1,120 +1,251 @@
 import numpy as np
-    
+
 def MAD(rmag: np.ndarray) -> float:
     """Calculates median absolute deviation of 1D data"""
-    n = len(rmag)
-    med = np.median(rmag)
-    data_med_diff = np.empty((n,))
-    for i in range(n):
-        data_med_diff[i] = abs(rmag[i] - med)
-    return np.median(data_med_diff)
+    return np.median(np.abs(rmag - np.median(rmag)))
 
 def TukeyWeights(rmag: np.ndarray, rmagMedian: float, MAD: float) -> np.ndarray:
-    n = len(rmag)
-    weights = np.empty((n,))
-    sigma = 1.4826 * MAD
-    s = sigma * sigma
-    for i in range(n):
-        rMedDiff = rmag[i] - rmagMedian
-        if abs(rMedDiff) <= sigma:
-            t = rMedDiff * rMedDiff / s
-            weights[i] = (1.0 - t) * (1.0 - t)
-        else:
-            weights[i] = 0.0
-
-    return weights
+    """Tukey bi-weights of residual magnitudes about their median, with a cutoff of 1.4826 * MAD
+    (residuals equal to the median get weight 1 when MAD is 0)"""
+    diff = np.asarray(rmag) - rmagMedian
+    sigma = 1.4826 * np.asarray(MAD)
+    degenerate = sigma == 0
+    if np.any(degenerate):
+        t = diff * diff / np.where(degenerate, 1.0, sigma * sigma)
+        return np.where(degenerate, diff == 0, (1.0 - t) * (1.0 - t) * (t <= 1.0))
+    t = diff * diff / (sigma * sigma)
+    return (1.0 - t) * (1.0 - t) * (t <= 1.0)
 
 def residualMag3D(data: np.ndarray, dataMean: np.ndarray) -> np.ndarray:
     """Calculates residual magnitude of 3D data"""
-    n = len(data)
-    rmag = np.empty((n,))
-    for i in range(n):
-        rmag[i] = np.linalg.norm(data[i]-dataMean)
-    return rmag
+    return np.linalg.norm(data - dataMean, axis=-1)
 
 def residualMag1D(data: np.ndarray, dataMean: float) -> np.ndarray:
     """Calculates residual magnitude of 1D data"""
-    n = len(data)
-    rmag = np.empty((n,))
-    for i in range(n):
-        rmag[i] = abs(data[i] - dataMean)
-    return rmag
+    return np.abs(data - dataMean)
 
 def weightedAvg3D(data: np.ndarray, weights: np.ndarray) -> np.ndarray:
     """Calculates weighted average from 3D data and a 1D set of corresponding weights"""
-    n = len(data)
-    weightedSum = np.zeros((3,))
-    for i in range(n):
-        weightedSum[0] += data[i, 0] * weights[i]
-        weightedSum[1] += data[i, 1] * weights[i]
-        weightedSum[2] += data[i, 2] * weights[i]
-    div = np.sum(weights)
-    ret = weightedSum/div
-    return ret
+    return weights @ data / np.sum(weights)
 
 def weightedAvg1D(data: np.ndarray, weights: np.array) -> np.ndarray:
     """Calculates weighted average from 1D data and a 1D set of corresponding weights"""
-    n = len(data)
-    weightedSum = 0
-    for i in range(n):
-        weightedSum += data[i] * weights[i]
-    ret = weightedSum / np.sum(weights)
-    return ret
+    return weights @ data / np.sum(weights)
 
-def robustAverage3D(data: np.ndarray) -> np.ndarray:
-    """Calculates robust average of 3D data based on Tukey bi-weight function:
+def _median(x: np.ndarray) -> np.ndarray:
+    """Median along the last axis, keeping it; a partial sort is much cheaper than np.median on small rows"""
+    n = x.shape[-1]
+    part = np.partition(x, ((n - 1) // 2, n // 2), axis=-1)
+    return 0.5 * (part[..., (n - 1) // 2:(n - 1) // 2 + 1] + part[..., n // 2:n // 2 + 1])
+
+def _tukeyStep(data: np.ndarray, dataMean: np.ndarray) -> np.ndarray:
+    """One Tukey bi-weight reweighting step for a batch of problems: data (b, n, d), dataMean (b, d)"""
+    residuals = data - dataMean[:, None, :]
+    rmag = np.sqrt(np.einsum('bnd,bnd->bn', residuals, residuals))
+    rmagMedian = _median(rmag)
+    weights = TukeyWeights(rmag, rmagMedian, _median(np.abs(rmag - rmagMedian)))
+    return np.einsum('bn,bnd->bd', weights, data) / weights.sum(axis=-1, keepdims=True)
+
+def robustAverage(data: np.ndarray, threshold: float = 1e-6, maxIter: int = 1000, returnIterations: bool = False):
+    """Calculates robust average based on Tukey bi-weight function, for one or a batch of data sets:
     https://ieeexplore.ieee.org/document/661192
+
+    Data of shape (n,) or (n, d) is one set of n samples; (..., n, d) is a batch of sets averaged
+    independently, each iterating until its average moves by at most threshold. To average the
+    columns of an (n, k) array as k separate 1D sets, pass data.T[..., None].
+
+    Returns the average ((), (d,) or (..., d)) and, if returnIterations, the number of iterations
+    of each set (same shape as the batch)
     """
+    data = np.asarray(data, dtype=float)
+    scalar = data.ndim == 1
+    if scalar:
+        data = data[:, None]
+    batchShape = data.shape[:-2]
+    n, d = data.shape[-2:]
+    data = data.reshape(-1, n, d)
 
-    threshold = 1e-6
-
-    # initial dataMean and dataMeanNew calculation:
-    dataMean = np.mean(data, 0)
-    rmag = residualMag3D(data, dataMean)
-    rmagMedian = np.median(rmag)
-    mad = MAD(rmag)
-    weights = TukeyWeights(rmag, rmagMedian, mad)
-    dataMeanNew = weightedAvg3D(data, weights)
-
-    # iterations
-    iterCount = 0
-    while np.linalg.norm(dataMean-dataMeanNew) > threshold and iterCount < 1000:
-        dataMean = dataMeanNew
-        rmag = residualMag3D(data, dataMean)
-        rmagMedian = np.median(rmag)
-        mad = MAD(rmag)
-        weights = TukeyWeights(rmag, rmagMedian, mad)
-        dataMeanNew = weightedAvg3D(data, weights)
-        iterCount += 1
-    if iterCount >= 1000:
-        print("Robust average did not converge to a threshold of 1e-6 after 1000 iterations")
+    # initial dataMean and dataMeanNew calculation
+    dataMean = data.mean(axis=1)
+    dataMeanNew = _tukeyStep(data, dataMean)
+
+    # iterations, each set frozen once it has converged
+    iterCount = np.zeros(len(data), dtype=int)
+    while True:
+        step = dataMeanNew - dataMean
+        active = (np.sqrt(np.einsum('bd,bd->b', step, step)) > threshold) & (iterCount < maxIter)
+        if not active.any():
+            break
+        dataMean = np.where(active[:, None], dataMeanNew, dataMean)
+        dataMeanNew = np.where(active[:, None], _tukeyStep(data, dataMean), dataMeanNew)
+        iterCount += active
+    if np.any(iterCount >= maxIter):
+        print(f"Robust average did not converge to a threshold of {threshold} after {maxIter} iterations")
+
+    dataMeanNew = dataMeanNew.reshape(batchShape + (d,))
+    iterCount = iterCount.reshape(batchShape)[()]
+    if scalar:
+        dataMeanNew = dataMeanNew[..., 0][()]
+    if returnIterations:
+        return dataMeanNew, iterCount
     return dataMeanNew
 
-def robustAverage1D(data: np.ndarray) -> float:
+def robustAverage3D(data: np.ndarray) -> np.ndarray:
     """Calculates robust average of 3D data based on Tukey bi-weight function:
     https://ieeexplore.ieee.org/document/661192
     """
-    threshold = 1e-6
+    return robustAverage(data)
 
-    # initial dataMean and dataMeanNew calculation
-    dataMean = np.mean(data)
-    rmag = residualMag1D(data, dataMean)
-    rmagMedian = np.median(rmag)
-    mad = MAD(rmag)
-    weights = TukeyWeights(rmag, rmagMedian, mad)
-    dataMeanNew = weightedAvg1D(data, weights)
-
-    # iterations
-    iterCount = 0
-    while abs(dataMean - dataMeanNew) > threshold and iterCount < 1000:
-        dataMean = dataMeanNew
-        rmag = residualMag1D(data, dataMean)
-        rmagMedian = np.median(rmag)
-        mad = MAD(rmag)
-        weights = TukeyWeights(rmag, rmagMedian, mad)
-        dataMeanNew = weightedAvg1D(data, weights)
-        iterCount += 1
-
-    if iterCount >= 1000:
-        print("Robust average did not converge to a threshold of 1e-6 after 1000 iterations")
-    return dataMeanNew
\ No newline at end of file
+def robustAverage1D(data: np.ndarray) -> float:
+    """Calculates robust average of 1D data based on Tukey bi-weight function:
+    https://ieeexplore.ieee.org/document/661192
+    """
+    return robustAverage(data)
+
+def projectToSO3(M: np.ndarray) -> np.ndarray:
+    """Closest rotation matrices (Frobenius norm) to a batch of 3x3 matrices (..., 3, 3)"""
+    U, S, Vt = np.linalg.svd(M)
+    D = np.ones(M.shape[:-1])
+    D[..., 2] = np.linalg.det(U @ Vt)
+    return (U * D[..., None, :]) @ Vt
+
+def robustRotationAverage(rotations: np.ndarray, threshold: float = 1e-6, maxIter: int = 1000,
+                          returnIterations: bool = False):
+    """Calculates robust chordal mean of rotation matrices based on Tukey bi-weight function
+
+    Each iteration weights the rotations by their chordal (Frobenius) distance to the current mean,
+    with the same Tukey weights as robustAverage, and projects the weighted element-wise mean back
+    onto SO(3). Rotations of shape (n, 3, 3) are one set; (..., n, 3, 3) is a batch of sets (e.g.
+    several tools) averaged independently, each until its mean moves by at most threshold.
+
+    Returns the mean rotation ((3, 3) or (..., 3, 3)) and, if returnIterations, the number of
+    iterations of each set (same shape as the batch)
+    """
+    rotations = np.asarray(rotations, dtype=float)
+    batchShape = rotations.shape[:-3]
+    n = rotations.shape[-3]
+    data = rotations.reshape(-1, n, 9)
+
+    # initial mean: projected element-wise average
+    mean = projectToSO3(data.mean(axis=1).reshape(-1, 3, 3)).reshape(-1, 9)
+    iterCount = np.zeros(len(data), dtype=int)
+    while True:
+        residuals = data - mean[:, None, :]
+        rmag = np.sqrt(np.einsum('bnd,bnd->bn', residuals, residuals))
+        rmagMedian = _median(rmag)
+        weights = TukeyWeights(rmag, rmagMedian, _median(np.abs(rmag - rmagMedian)))
+        weighted = np.einsum('bn,bnd->bd', weights, data) / weights.sum(axis=-1, keepdims=True)
+        meanNew = projectToSO3(weighted.reshape(-1, 3, 3)).reshape(-1, 9)
+
+        step = meanNew - mean
+        active = (np.sqrt(np.einsum('bd,bd->b', step, step)) > threshold) & (iterCount < maxIter)
+        mean = np.where(active[:, None], meanNew, mean)
+        if not active.any():
+            break
+        iterCount += active
+    if np.any(iterCount >= maxIter):
+        print(f"Robust rotation average did not converge to a threshold of {threshold} after {maxIter} iterations")
+
+    mean = mean.reshape(batchShape + (3, 3))
+    if returnIterations:
+        return mean, iterCount.reshape(batchShape)[()]
+    return mean
+
+class StreamingRobustEstimator:
+    """Robust running location of a stream of d-dimensional samples (e.g. tool positions and
+    rotation elements) with fixed memory and O(1) cost per sample and per query.
+
+    The last `window` samples are kept in a preallocated ring. The location starts as the median of
+    the first samples and then follows an online M-estimator: each sample moves the location by a
+    Tukey bi-weighted step of gain 1 / min(count, window), with its residual measured against a running
+    per-dimension scale (mean absolute deviation of inliers). With `trend` the estimator also tracks a
+    velocity (a critically damped alpha-beta filter), so the location of a tool moving at constant speed
+    does not lag behind it; the velocity settles within about a window, so this suits short windows
+    (around 10 samples) for live readouts. After `resetAfter` consecutive rejected samples the tool is taken to have
+    moved, and the estimate restarts from the newest samples.
+
+    `minScale` (scalar or per dimension) should be about the noise of the source, e.g. the tracker
+    jitter: identical warm-up samples would otherwise collapse the scale and every later sample
+    would be rejected until the next restart.
+    """
+    def __init__(self, dim: int, window: int = 40, cutoff: float = 4.685, warmup: int = 5, resetAfter: int = None,
+                 minScale=1e-6, trend: bool = False):
+        self.dim = dim
+        self.window = window
+        self.cutoff = cutoff
+        self.warmup = max(1, min(warmup, window))
+        self.resetAfter = resetAfter if resetAfter is not None else max(self.warmup, window // 4)
+        self.minScale = np.broadcast_to(np.asarray(minScale, dtype=float), (dim,))
+        self.trend = trend
+        self.samples = np.empty((window, dim))
+        self.reset()
+
+    def reset(self):
+        """Discards all samples"""
+        self.count = 0
+        self.head = 0
+        self.updates = 0
+        self.rejected = 0
+        self.location = np.full(self.dim, np.nan)
+        self.velocity = np.zeros(self.dim)
+        self.scale = np.full(self.dim, np.nan)
+
+    def __len__(self):
+        """Number of samples held in the ring"""
+        return min(self.count, self.window)
+
+    def recent(self, n: int = None) -> np.ndarray:
+        """The last n (default: all held) samples, oldest first"""
+        n = len(self) if n is None else min(n, len(self))
+        return self.samples[(self.head - n + np.arange(n)) % self.window]
+
+    def add(self, sample: np.ndarray) -> float:
+        """Adds one sample (ignored if it holds NaN) and returns its weight in the estimate"""
+        sample = np.asarray(sample, dtype=float).reshape(self.dim)
+        if np.isnan(sample).any():
+            return 0.0
+        self.samples[self.head] = sample
+        self.head = (self.head + 1) % self.window
+        self.count += 1
+
+        # Warm-up (and restart after the tool moved): median and MAD of the newest samples
+        if self.updates < self.warmup:
+            self._restart(min(self.updates + 1, len(self)))
+            return 1.0
+
+        # Online M-estimator step, against the location predicted for this sample
+        prediction = self.location + self.velocity
+        residual = sample - prediction
+        u = np.sqrt(np.mean((residual / self.scale) ** 2)) / self.cutoff
+        weight = (1.0 - u * u) ** 2 if u < 1.0 else 0.0
+        if weight == 0.0:
+            self.location = prediction
+            self.rejected += 1
+            if self.rejected >= self.resetAfter:
+                self._restart(self.rejected)
+            return weight
+        self.rejected = 0
+        self.updates += 1
+        gain = 1.0 / min(self.updates, self.window)
+        self.location = prediction + gain * weight * residual
+        if self.trend:
+            self.velocity += gain * gain / (2.0 - gain) * weight * residual
+        self.scale += gain * (np.minimum(np.abs(residual), 3.0 * self.scale) - self.scale)
+        self.scale = np.maximum(self.scale, self.minScale)
+        return weight
+
+    def _restart(self, n: int):
+        """Re-seeds location, velocity and scale from the newest n samples"""
+        recent = self.recent(n)
+        if self.trend and n > 1:
+            # Theil-Sen slope: median of the slopes between all pairs of samples
+            i, j = np.triu_indices(n, 1)
+            self.velocity = np.median((recent[j] - recent[i]) / (j - i)[:, None], axis=0)
+        else:
+            self.velocity = np.zeros(self.dim)
+        # Samples brought forward to the time of the newest one
+        recent = recent + np.arange(n - 1, -1, -1)[:, None] * self.velocity
+        self.location = np.median(recent, axis=0)
+        self.scale = np.maximum(np.median(np.abs(recent - self.location), axis=0), self.minScale)
+        self.updates = n
+        self.rejected = 0
@@ -0,0 +1,164 @@
+import time
+import threading
+import numpy as np
+
+# Frames kept in the ring buffer (about a minute at the Polaris' 60 Hz)
+BUFFER_CAPACITY = 4096
+
+class TrackingBuffer:
+    """
+    Preallocated ring buffer of tracker frames. One writer (the acquisition thread) appends frames,
+    and any number of readers take copies of the newest frames; the lock is only held while a frame
+    is copied in or out, so neither side waits on the other's processing.
+    """
+    def __init__(self, numPorts, capacity=BUFFER_CAPACITY):
+        self.numPorts = numPorts
+        self.capacity = capacity
+        self.portHandles = np.zeros((capacity, numPorts), dtype=np.int64)
+        self.timestamps = np.full((capacity, numPorts), np.nan)
+        self.hostTimes = np.full(capacity, np.nan)
+        self.frameNumbers = np.zeros((capacity, numPorts), dtype=np.int64)
+        self.matrices = np.full((capacity, numPorts, 4, 4), np.nan)
+        self.quality = np.full((capacity, numPorts), np.nan)
+        self.count = 0
+        self.lock = threading.Lock()
+
+    def write(self, portHandles, timestamps, frameNumbers, tracking, quality, hostTime=None):
+        """
+        Appends one frame as returned by NDITracker.get_frame(), stamped with the host's monotonic clock.
+        Ports missing from the frame are stored as not tracked (NaN), not left over from an older frame.
+        """
+        hostTime = time.monotonic() if hostTime is None else hostTime
+        n = min(self.numPorts, len(tracking))
+        with self.lock:
+            i = self.count % self.capacity
+            self.portHandles[i, :n] = portHandles[:n]
+            self.portHandles[i, n:] = 0
+            self.timestamps[i, :n] = timestamps[:n]
+            self.timestamps[i, n:] = np.nan
+            self.hostTimes[i] = hostTime
+            self.frameNumbers[i, :n] = frameNumbers[:n]
+            self.frameNumbers[i, n:] = 0
+            self.matrices[i, :n] = np.asarray(tracking[:n], dtype=float).reshape(n, 4, 4)
+            self.matrices[i, n:] = np.nan
+            self.quality[i, :n] = quality[:n]
+            self.quality[i, n:] = np.nan
+            self.count += 1
+
+    def since(self, count):
+        """
+        Copies of the frames written after the first `count` frames (at most the whole buffer)
+
+        Arguments:  count (int):    number of frames already read, e.g. the count returned last time
+
+        Returns:    frames (dict):  "portHandles", "timestamps", "hostTimes", "frameNumbers", "matrices"
+                                    (k x ports x 4 x 4) and "quality", oldest first
+                    count (int):    total number of frames written, to pass to the next call
+        """
+        with self.lock:
+            total = self.count
+            k = min(total - count, self.capacity)
+            idx = (total - k + np.arange(k)) % self.capacity
+            frames = {
+                "portHandles": self.portHandles[idx],
+                "timestamps": self.timestamps[idx],
+                "hostTimes": self.hostTimes[idx],
+                "frameNumbers": self.frameNumbers[idx],
+                "matrices": self.matrices[idx],
+                "quality": self.quality[idx],
+            }
+        return frames, total
+
+    def latest(self, k=1):
+        """Copies of the newest k frames (see since)"""
+        with self.lock:
+            total = self.count
+        return self.since(max(0, total - k))[0]
+
+    def around(self, hostTime, n, ports=None, maxGap=None):
+        """
+        The n buffered frames closest in time to hostTime (e.g. when a video frame was grabbed) in
+        which all of the given ports are tracked, so that they bracket it once enough newer frames
+        have arrived
+
+        Arguments:  hostTime (float):   time on the time.monotonic() clock
+                    n (int):            number of frames
+                    ports (list):       ports that must be tracked (no NaN), all if None
+                    maxGap (float):     if given, frames further than this from hostTime (s) are not used,
+                                        e.g. when the tracker stalled
+
+        Returns:    frames (dict):      as in since, oldest first (fewer than n if the buffer holds fewer
+                                        usable frames)
+                    numAfter (int):     number of usable frames newer than hostTime in the whole buffer
+        """
+        frames = self.latest(self.capacity)
+        ports = list(range(self.numPorts)) if ports is None else list(ports)
+        valid = ~np.isnan(frames["matrices"][:, ports]).any(axis=(1, 2, 3))
+        if maxGap is not None:
+            valid &= np.abs(frames["hostTimes"] - hostTime) <= maxGap
+        idx = np.flatnonzero(valid)
+        nearest = idx[np.argsort(np.abs(frames["hostTimes"][idx] - hostTime), kind='stable')[:n]]
+        nearest.sort()
+        numAfter = int(np.count_nonzero(frames["hostTimes"][idx] > hostTime))
+        return {name: values[nearest] for name, values in frames.items()}, numAfter
+
+    def rate(self, window=60):
+        """Acquisition rate in frames per second over the newest `window` frames"""
+        hostTimes = self.latest(window)["hostTimes"]
+        if len(hostTimes) < 2 or hostTimes[-1] <= hostTimes[0]:
+            return 0.0
+        return (len(hostTimes) - 1) / (hostTimes[-1] - hostTimes[0])
+
+class TrackerAcquisition:
+    """
+    Polls an NDITracker on a background thread at the device's own rate and writes every new frame
+    (repeated polls of the same frame number are dropped) into a TrackingBuffer.
+    """
+    def __init__(self, tracker, numPorts, capacity=BUFFER_CAPACITY, idleSleep=0.001):
+        self.tracker = tracker
+        self.buffer = TrackingBuffer(numPorts, capacity)
+        self.idleSleep = idleSleep
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.error = None
+
+    def start(self):
+        """Starts tracking and the acquisition thread"""
+        if self.thread is not None:
+            return
+        self.tracker.start_tracking()
+        self.stopEvent.clear()
+        self.error = None
+        self.thread = threading.Thread(target=self._run, name="TrackerAcquisition", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the acquisition thread and tracking"""
+        if self.thread is None:
+            return
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+        self.tracker.stop_tracking()
+
+    def isRunning(self):
+        """True while the acquisition thread is alive"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self):
+        lastFrameNumbers = None
+        while not self.stopEvent.is_set():
+            try:
+                port_handles, time_stamps, frame_numbers, tracking, tracking_quality = self.tracker.get_frame()
+            except Exception as e:
+                print(f"Tracker acquisition stopped: {e}")
+                self.error = e
+                return
+
+            frameNumbers = list(frame_numbers)
+            if frameNumbers == lastFrameNumbers:
+                # The device has no new frame yet; yield instead of spinning on the GIL
+                time.sleep(self.idleSleep)
+                continue
+            lastFrameNumbers = frameNumbers
+            self.buffer.write(port_handles, time_stamps, frame_numbers, tracking, tracking_quality)
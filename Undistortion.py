@@ -0,0 +1,116 @@
+import os
+import hashlib
+import threading
+import numpy as np
+import cv2
+
+from collections import OrderedDict
+
+# Number of undistortion map sets kept in memory (one per camera/resolution in use)
+MAX_CACHED_MAPS = 8
+
+_maps = OrderedDict()
+# _lock only guards the dicts and set below; building, loading and saving maps happens under a
+# per-key lock, so a slow build for one camera never blocks callers using another
+_lock = threading.Lock()
+_keyLocks = {}
+_saved = set()
+
+def _mapKey(intMtx, distCoeffs, size, alpha):
+    """Hashes the parameters that determine an undistortion map"""
+    h = hashlib.sha1()
+    h.update(np.ascontiguousarray(intMtx, dtype=np.float64).tobytes())
+    h.update(np.ascontiguousarray(distCoeffs, dtype=np.float64).tobytes())
+    h.update(np.array([size[0], size[1]], dtype=np.int64).tobytes())
+    h.update(np.float64(alpha).tobytes())
+    return h.hexdigest()
+
+def _loadMaps(path):
+    """Reads persisted remap tables, None if there are none or they cannot be read"""
+    if not os.path.isfile(path):
+        return None
+    try:
+        with np.load(path) as f:
+            return f["map1"], f["map2"], f["newCameraMtx"]
+    except (OSError, KeyError, ValueError):
+        print(f"Could not read undistortion maps from {path}, rebuilding")
+        return None
+
+def _saveMaps(path, maps):
+    """Persists remap tables unless the file already exists; each path is only tried once"""
+    if not os.path.isfile(path):
+        map1, map2, newCameraMtx = maps
+        try:
+            tmp = f"{path}.tmp.npz"
+            np.savez(tmp, map1=map1, map2=map2, newCameraMtx=newCameraMtx)
+            os.replace(tmp, path)
+        except OSError:
+            print(f"Could not write undistortion maps to {path}")
+    with _lock:
+        _saved.add(path)
+
+def getUndistortMaps(intMtx, distCoeffs, size, alpha=1, cacheDir=None):
+    """
+    Returns cv2.remap tables for undistorting images, building them only once per
+    (intrinsics, distortion coefficients, image size, alpha). Tables are kept in memory and,
+    if cacheDir is given, persisted there so they survive a restart (also when they were first
+    built without a cacheDir).
+
+    Arguments:  intMtx (np.ndarray, 3x3):       camera intrinsic matrix
+                distCoeffs (np.ndarray, 1x5):   camera distortion coefficients
+                size (tuple):                   image size (w, h)
+                alpha (float):                  free scaling parameter of cv2.getOptimalNewCameraMatrix
+                cacheDir (str):                 directory to persist tables in, e.g. the one holding intcal.xml
+
+    Returns:    map1, map2:                     fixed-point (CV_16SC2) remap tables
+                newCameraMtx (np.ndarray, 3x3): camera matrix of the undistorted image
+    """
+    key = _mapKey(intMtx, distCoeffs, size, alpha)
+    path = None if cacheDir is None else os.path.join(cacheDir, f"undistort_{key[:16]}.npz")
+    with _lock:
+        maps = _maps.get(key)
+        if maps is not None:
+            _maps.move_to_end(key)
+            if path is None or path in _saved:
+                return maps
+        keyLock = _keyLocks.setdefault(key, threading.Lock())
+
+    with keyLock:
+        if maps is None:
+            # Another caller may have built the tables while this one waited
+            with _lock:
+                maps = _maps.get(key)
+        if maps is None:
+            maps = None if path is None else _loadMaps(path)
+            if maps is None:
+                newCameraMtx, roi = cv2.getOptimalNewCameraMatrix(intMtx, distCoeffs, size, alpha, size)
+                map1, map2 = cv2.initUndistortRectifyMap(intMtx, distCoeffs, None, newCameraMtx, size, cv2.CV_16SC2)
+                maps = (map1, map2, newCameraMtx)
+            with _lock:
+                _maps[key] = maps
+                if len(_maps) > MAX_CACHED_MAPS:
+                    # The evicted key's lock goes with it, so _keyLocks stays as small as the LRU; at
+                    # worst a caller still holding it builds the same tables twice
+                    evicted, _ = _maps.popitem(last=False)
+                    _keyLocks.pop(evicted, None)
+        if path is not None and path not in _saved:
+            _saveMaps(path, maps)
+    return maps
+
+def undistortImage(img, intMtx, distCoeffs, alpha=1, cacheDir=None):
+    """
+    Undistorts an image with cached remap tables, equivalent to cv2.undistort into the
+    camera matrix given by cv2.getOptimalNewCameraMatrix
+
+    Arguments:  img (np.ndarray):               distorted image
+                intMtx (np.ndarray, 3x3):       camera intrinsic matrix
+                distCoeffs (np.ndarray, 1x5):   camera distortion coefficients
+                alpha (float):                  free scaling parameter of cv2.getOptimalNewCameraMatrix
+                cacheDir (str):                 directory to persist tables in
+
+    Returns:    img (np.ndarray):               undistorted image
+                newCameraMtx (np.ndarray, 3x3): camera matrix of the undistorted image
+    """
+    h, w = img.shape[:2]
+    map1, map2, newCameraMtx = getUndistortMaps(intMtx, distCoeffs, (w, h), alpha, cacheDir)
+    return cv2.remap(img, map1, map2, cv2.INTER_LINEAR), newCameraMtx
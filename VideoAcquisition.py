@@ -0,0 +1,149 @@
+import time
+import threading
+import numpy as np
+import cv2
+import Undistortion
+
+from collections import deque
+
+class LatestFrameBuffer:
+    """
+    Triple buffer holding the newest video frame. The writer fills whichever of three preallocated
+    slots is neither the newest frame nor the one the reader holds, then publishes it; the reader
+    always gets the newest frame, and frames it never picked up are dropped. The lock is only held
+    to swap slot indices, never while a frame is written or used.
+    """
+    def __init__(self):
+        self.slots = [None, None, None]
+        self.times = [np.nan, np.nan, np.nan]
+        self.lock = threading.Lock()
+        self.latest = None
+        self.reading = None
+        self.count = 0
+        self.taken = 0
+        self.dropped = 0
+
+    def writeSlot(self, shape, dtype):
+        """Index and array of a free slot for a frame of the given shape, allocated on first use"""
+        with self.lock:
+            idx = next(i for i in range(3) if i != self.latest and i != self.reading)
+        if self.slots[idx] is None or self.slots[idx].shape != shape or self.slots[idx].dtype != dtype:
+            self.slots[idx] = np.empty(shape, dtype)
+        return idx, self.slots[idx]
+
+    def publish(self, idx, timestamp):
+        """Makes slot idx the newest frame, grabbed at timestamp"""
+        with self.lock:
+            if self.latest is not None and self.taken < self.count:
+                self.dropped += 1
+            self.times[idx] = timestamp
+            self.latest = idx
+            self.count += 1
+
+    def take(self):
+        """
+        The newest frame, if one arrived since the last call
+
+        Returns:    frame (np.ndarray):     the frame, valid until the next call (None if no new frame)
+                    timestamp (float):      time.monotonic() when it was grabbed (None if no new frame)
+        """
+        with self.lock:
+            if self.latest is None or self.taken == self.count:
+                return None, None
+            self.reading = self.latest
+            self.taken = self.count
+            return self.slots[self.reading], self.times[self.reading]
+
+class VideoAcquisition:
+    """
+    Grabs frames from a cv2.VideoCapture on a background thread as fast as the camera delivers them,
+    undistorts them there with the cached remap tables from Undistortion, and keeps only the newest
+    one in a LatestFrameBuffer.
+    """
+    def __init__(self, source, rateWindow=1.0):
+        self.source = source
+        self.buffer = LatestFrameBuffer()
+        self.rateWindow = rateWindow
+        self.sourceLock = threading.Lock()
+        self.undistortion = None
+        self.thread = None
+        self.stopEvent = threading.Event()
+        self.captureTimes = deque(maxlen=240)
+        self.processTimes = deque(maxlen=240)
+        self.frameAge = np.nan
+        self.failedReads = 0
+
+    def setUndistortion(self, intMtx, distCoeffs, cacheDir=None):
+        """Undistorts frames from now on (no undistortion if intMtx is None)"""
+        self.undistortion = None if intMtx is None else (intMtx, distCoeffs, cacheDir)
+
+    def setProperty(self, prop, value):
+        """Sets a cv2.CAP_PROP_* property without racing the capture thread"""
+        with self.sourceLock:
+            return self.source.set(prop, value)
+
+    def start(self):
+        """Starts the capture thread"""
+        if self.thread is not None:
+            return
+        self.stopEvent.clear()
+        self.thread = threading.Thread(target=self._run, name="VideoAcquisition", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """Stops the capture thread"""
+        if self.thread is None:
+            return
+        self.stopEvent.set()
+        self.thread.join()
+        self.thread = None
+
+    def isRunning(self):
+        """True while the capture thread is alive"""
+        return self.thread is not None and self.thread.is_alive()
+
+    def latestFrame(self):
+        """
+        The newest (undistorted) frame if one arrived since the last call, else (None, None); the
+        frame stays valid until the next call
+
+        Returns:    frame (np.ndarray), timestamp (float, time.monotonic() when grabbed)
+        """
+        frame, timestamp = self.buffer.take()
+        if frame is not None:
+            now = time.monotonic()
+            self.processTimes.append(now)
+            self.frameAge = now - timestamp
+        return frame, timestamp
+
+    def stats(self):
+        """Capture and processing (hand-out) rates in fps, age in ms of the last frame handed out, dropped frames"""
+        now = time.monotonic()
+        captureFps = sum(1 for t in list(self.captureTimes) if now - t <= self.rateWindow) / self.rateWindow
+        processingFps = sum(1 for t in list(self.processTimes) if now - t <= self.rateWindow) / self.rateWindow
+        return {"captureFps": captureFps, "processingFps": processingFps, "frameAgeMs": 1000 * self.frameAge,
+                "dropped": self.buffer.dropped}
+
+    def _run(self):
+        raw = None
+        while not self.stopEvent.is_set():
+            with self.sourceLock:
+                ok, raw = self.source.read(raw)
+            timestamp = time.monotonic()
+            if not ok or raw is None:
+                self.failedReads += 1
+                raw = None
+                time.sleep(0.005)
+                continue
+            self.captureTimes.append(timestamp)
+
+            idx, slot = self.buffer.writeSlot(raw.shape, raw.dtype)
+            undistortion = self.undistortion
+            if undistortion is None:
+                np.copyto(slot, raw)
+            else:
+                intMtx, distCoeffs, cacheDir = undistortion
+                h, w = raw.shape[:2]
+                map1, map2, newCameraMtx = Undistortion.getUndistortMaps(intMtx, distCoeffs, (w, h), cacheDir=cacheDir)
+                cv2.remap(raw, map1, map2, cv2.INTER_LINEAR, dst=slot)
+            self.buffer.publish(idx, timestamp)
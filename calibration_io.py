@@ -33,6 +33,23 @@ def readIntCalFromXml(fname: str):
     qfile.close()
     return intMtx, distCoeffs
 
+def readIntCalImageSizeFromXml(fname: str):
+    """Image size (w, h) an intrinsic calibration was computed for, None if the file does not record it"""
+    qfile = QtCore.QFile(fname)
+    imageSize = None
+    if qfile.open(QtCore.QIODevice.ReadOnly):
+        reader = QtCore.QXmlStreamReader()
+        reader.setDevice(qfile)
+        while not reader.atEnd():
+            reader.readNext()
+            if reader.isStartElement() and str(reader.name()) == "ImageSize":
+                attributes = reader.attributes()
+                imageSize = (int(attributes.value("Width")), int(attributes.value("Height")))
+                break
+
+    qfile.close()
+    return imageSize
+
 def readTrackingFromXml(fname):
     qfile = QtCore.QFile(fname)
     trackingPositions = []
@@ -166,6 +183,9 @@ def writeTrackingToXml(fname: str, captureList: list):
 
     for capture in captureList:
         stream.writeStartElement("TrackingCapture")
+        if len(capture) > 2 and capture[2] is not None:
+            # Host time (time.monotonic(), s) of the video frame the tracking was synchronised to
+            stream.writeAttribute("timestamp", f"{capture[2]:.6f}")
         stream.writeStartElement("Position")
         stream.writeTextElement("x", str(capture[0][0]))
         stream.writeTextElement("y", str(capture[0][1]))
@@ -200,7 +220,7 @@ def writePivotCalToXml(fname, pivotCalMat):
 
     qfile.close()
 
-def writeIntCalToXml(fname, intMtx, distCoeffs):
+def writeIntCalToXml(fname, intMtx, distCoeffs, imageSize=None):
     qfile = QtCore.QFile(fname)
     qfile.open(QtCore.QIODevice.WriteOnly)
     stream = QtCore.QXmlStreamWriter(qfile)
@@ -222,6 +242,13 @@ def writeIntCalToXml(fname, intMtx, distCoeffs):
         stream.writeTextElement("Coefficient", str(coefficient))
     stream.writeEndElement()
 
+    # image size the calibration is valid for
+    if imageSize is not None:
+        stream.writeStartElement("ImageSize")
+        stream.writeAttribute("Width", str(imageSize[0]))
+        stream.writeAttribute("Height", str(imageSize[1]))
+        stream.writeEndElement()
+
     stream.writeEndElement()
     stream.writeEndDocument()
 
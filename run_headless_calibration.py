@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""
+Runs hand-eye calibration on a capture directory without a display, e.g.:
+`python run_headless_calibration.py sample_calibration_images sample_calibration_images/stylus_tracking_captures.xml intcal.xml`
+"""
+
+import os
+import argparse
+
+import numpy as np
+import calibration_io as cio
+import HandEyeCalLogic as he
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless point-to-line hand-eye calibration")
+    parser.add_argument("images", help="directory holding capture_1.png, capture_2.png, ...")
+    parser.add_argument("tracking", help="stylus tracking captures XML file")
+    parser.add_argument("intcal", help="intrinsic calibration XML file")
+    parser.add_argument("--output", help="output directory (default: <images>/output)")
+    parser.add_argument("--workers", type=int, default=None, help="number of detection threads")
+    parser.add_argument("--ransac", action="store_true", help="use outlier-robust RANSAC registration")
+    parser.add_argument("--refine", choices=["huber", "tukey"], default=None,
+                        help="refine the solve on pixel reprojection error with this robust loss")
+    parser.add_argument("--point-undistort", action="store_true",
+                        help="detect on raw frames and undistort only the detected centers")
+    parser.add_argument("--no-cache", action="store_true", help="do not use the on-disk detection cache")
+    parser.add_argument("--cv", default=None, help="cross-validate with this many folds, or 'loo' for leave-one-out")
+    parser.add_argument("--bootstrap", type=int, default=None, help="number of bootstrap replicates for uncertainty")
+    parser.add_argument("--seed", type=int, default=0, help="seed for the bootstrap resampling")
+    parser.add_argument("--review", action="store_true",
+                        help="segment frames without a detection by hand afterwards and recalibrate (needs a display)")
+    parser.add_argument("--detector", choices=sorted(he.DETECTORS), default="hough", help="stylus tip detector")
+    args = parser.parse_args()
+
+    output_path = args.output if args.output else f"{args.images}/output"
+
+    imageFiles = he.listCaptureFrames(args.images)
+    trackingPositions, trackingRotations = cio.readTrackingFromXml(args.tracking)
+    intMat, distCoeffs = cio.readIntCalFromXml(args.intcal)
+    cacheDir = os.path.dirname(args.intcal)
+    detectionCacheFile = None if args.no_cache else f"{args.images}/detection_cache.json"
+
+    def calibrate(reviewedCenters=None):
+        return he.analyzeFrames(imageFiles, trackingPositions, intMat, distCoeffs,
+                                ransac=args.ransac, workers=args.workers,
+                                refine=args.refine is not None, refineLoss=args.refine or "huber",
+                                interactive=False, overlayDir=output_path, cacheDir=cacheDir,
+                                undistortFrames=not args.point_undistort, detector=args.detector,
+                                detectionCacheFile=detectionCacheFile, reviewedCenters=reviewedCenters,
+                                crossValidation=args.cv, bootstrap=args.bootstrap, bootstrapSeed=args.seed,
+                                returnInfo=True)
+
+    extMat, px, pxErrs, distErrs, angularErrs, info = calibrate()
+    if len(info["reviewQueue"]) > 0:
+        print(f"Frames queued for manual review: {[i + 1 for i in info['reviewQueue']]}")
+        if args.review:
+            # Segment the rejected frames by hand, then calibrate again with them
+            reviewedCenters = he.reviewFrames(imageFiles, info["reviewQueue"], intMat, distCoeffs, cacheDir=cacheDir)
+            extMat, px, pxErrs, distErrs, angularErrs, info = calibrate(reviewedCenters)
+
+    print(f"Average pixel error: {np.mean(pxErrs)} px")
+    print(f"Average distance error: {np.mean(distErrs)} mm")
+    print(f"Average angular error: {np.mean(angularErrs)} deg")
+
+    if info["bootstrap"] is not None:
+        for name, unit in (("rotation", "deg"), ("translation", "mm")):
+            lower, upper = info["bootstrap"][f"{name}Interval"]
+            print(f"Bootstrap {name} 95% interval ({unit}, x/y/z): {lower} to {upper}")
+
+    he.writeReprojectionImages(imageFiles, px, info["frameIndices"], intMat, distCoeffs, output_path,
+                               cacheDir=cacheDir)
+    cio.writeErrToCsv(pxErrs, distErrs, angularErrs, output_path)
+    cio.writeHECalToXml(f"{output_path}/hand_eye_calibration.xml", intMat, distCoeffs, extMat)
+
+
+if __name__ == "__main__":
+    main()
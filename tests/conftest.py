@@ -0,0 +1,37 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def makeCorrespondences(n, noise=0.0, seed=0):
+    """
+    Synthetic stylus tip correspondences seen by a pinhole camera
+
+    Returns:    X (3xn):        3D coordinates, tracker space
+                Q (2xn):        2D pixel locations, image space
+                A (3x3):        camera matrix
+                R (3x3), t (3x1):   true registration, tracker to camera
+    """
+    rng = np.random.default_rng(seed)
+    A = np.array([[800.0, 0.0, 320.0], [0.0, 800.0, 240.0], [0.0, 0.0, 1.0]])
+    angle = np.radians(20)
+    R = np.array([[np.cos(angle), 0.0, np.sin(angle)], [0.0, 1.0, 0.0], [-np.sin(angle), 0.0, np.cos(angle)]])
+    t = np.array([[15.0], [-10.0], [300.0]])
+
+    # Points in front of the camera, inside the image
+    P = np.vstack((rng.uniform(-60, 60, n), rng.uniform(-45, 45, n), rng.uniform(-40, 40, n)))
+    P[2] += t[2, 0]
+    X = R.T @ (P - t)
+    q = A @ P
+    Q = q[:2] / q[2] + rng.normal(0.0, noise, (2, n))
+    return X, Q, A, R, t
+
+
+@pytest.fixture
+def correspondences():
+    return makeCorrespondences(40, noise=0.5)
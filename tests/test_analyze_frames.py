@@ -0,0 +1,115 @@
+import cv2
+import numpy as np
+import pytest
+
+import HandEyeCalLogic as he
+from conftest import makeCorrespondences
+
+
+def makeSession(folder, distCoeffs, n=12, noise=0.0):
+    """Synthetic capture session: one green stylus tip per image at the (distorted) projection of each tracked point"""
+    X, Q, A, R, t = makeCorrespondences(n, noise=noise, seed=3)
+    distorted = cv2.undistortPoints(Q.T.reshape(-1, 1, 2), A, None)
+    distorted = cv2.projectPoints(np.concatenate((distorted, np.ones((n, 1, 1))), axis=2), np.zeros(3), np.zeros(3),
+                                  A, distCoeffs)[0][:, 0].T
+    frames = []
+    for i in range(n):
+        img = np.zeros((480, 640, 3), np.uint8)
+        cv2.circle(img, (int(round(distorted[0, i])), int(round(distorted[1, i]))), 25, (0, 200, 0), -1)
+        fname = str(folder / f"capture_{i + 1}.png")
+        cv2.imwrite(fname, img)
+        frames.append(fname)
+    return frames, X.T, A, distCoeffs, distorted
+
+
+@pytest.fixture
+def session(tmp_path):
+    return makeSession(tmp_path, np.zeros((1, 5)))
+
+
+@pytest.fixture
+def distortedSession(tmp_path):
+    return makeSession(tmp_path, np.array([[-0.25, 0.08, 0.0, 0.0, 0.0]]), n=16, noise=1.5)
+
+
+def test_reviewed_centers_replace_rejected_frames(session):
+    frames, transforms, A, distCoeffs, Q = session
+    cv2.imwrite(frames[2], np.zeros((480, 640, 3), np.uint8))
+
+    result = he.analyzeFrames(frames, transforms, A, distCoeffs, interactive=False, workers=1, returnInfo=True)
+    info = result[5]
+    assert info["reviewQueue"] == [2]
+    assert 2 not in info["frameIndices"]
+
+    newCameraMtx = he.loadFrame(frames[0], A, distCoeffs)[1]
+    center = cv2.undistortPoints(Q[:, 2].reshape(1, 1, 2), A, distCoeffs, P=newCameraMtx)[0, 0]
+    result = he.analyzeFrames(frames, transforms, A, distCoeffs, interactive=False, workers=1,
+                              reviewedCenters={2: center}, returnInfo=True)
+    info = result[5]
+    assert info["reviewQueue"] == []
+    assert 2 in info["frameIndices"]
+    assert result[2][info["frameIndices"].index(2), 0] < 2.0
+
+
+def test_training_and_held_out_errors_use_the_undistorted_camera(distortedSession):
+    frames, transforms, A, distCoeffs, Q = distortedSession
+    calibration, px, pxErrs, distErrs, angularErrs, info = he.analyzeFrames(
+        frames, transforms, A, distCoeffs, interactive=False, workers=1, crossValidation="loo", returnInfo=True)
+    newCameraMtx = he.loadFrame(frames[0], A, distCoeffs)[1]
+    assert not np.allclose(newCameraMtx, A)
+
+    # Points are reprojected with the camera matrix the circle centers (and the solve) are in
+    projected = newCameraMtx @ (calibration[:3, :3] @ transforms.T + calibration[:3, 3:])
+    assert np.allclose(px, projected[:2] / projected[2])
+
+    # Held-out errors can then only be larger than the training errors
+    heldOut = info["crossValidation"]["summary"]
+    assert heldOut["pxErrs"]["mean"] > info["summary"]["pxErrs"]["mean"]
+    assert heldOut["distErrs"]["mean"] > info["summary"]["distErrs"]["mean"]
+
+
+def test_refinement_lowers_the_reported_pixel_error(distortedSession):
+    frames, transforms, A, distCoeffs, Q = distortedSession
+    unrefined = he.analyzeFrames(frames, transforms, A, distCoeffs, interactive=False, workers=1, returnInfo=True)
+    refined = he.analyzeFrames(frames, transforms, A, distCoeffs, interactive=False, workers=1, refine=True,
+                               refineLoss="huber", returnInfo=True)
+    refinement = refined[5]["refinement"]
+    assert refinement["finalErr"] <= refinement["initialErr"]
+    assert np.isclose(refinement["initialErr"], np.mean(unrefined[2]))
+    assert np.isclose(refinement["finalErr"], np.mean(refined[2]))
+
+
+def test_too_few_usable_frames_raise_a_clear_error(session, tmp_path):
+    frames, transforms, A, distCoeffs, Q = session
+    for fname in frames[3:]:
+        cv2.imwrite(fname, np.zeros((480, 640, 3), np.uint8))
+    with pytest.raises(ValueError, match="Only 3 of 12 frames"):
+        he.analyzeFrames(frames, transforms, A, distCoeffs, interactive=False, workers=1,
+                         overlayDir=str(tmp_path / "overlays"))
+    # Overlays of the usable frames were still written before the error
+    assert len(list((tmp_path / "overlays").iterdir())) == 3
+
+
+def test_moments_detector_agrees_with_hough(session):
+    frames, transforms, A, distCoeffs, Q = session
+    for fname, q in zip(frames[:4], Q.T):
+        img = cv2.imread(fname)
+        (hx, hy), hr, _ = he.houghDetector(img)
+        (mx, my), mr, confidence = he.momentsDetector(img)
+        assert np.hypot(mx - hx, my - hy) < 2.0
+        assert np.hypot(mx - q[0], my - q[1]) < 1.0
+        assert abs(mr - hr) < 3.0 and abs(mr - 25) < 1.0
+        assert confidence > 0.9
+
+
+def test_moments_detector_falls_back_to_hough_on_the_same_mask(session, monkeypatch):
+    frames, transforms, A, distCoeffs, Q = session
+    img = cv2.imread(frames[0])
+    calls = []
+    greenTipMask = he.greenTipMask
+    monkeypatch.setattr(he, "greenTipMask", lambda im: calls.append(im) or greenTipMask(im))
+
+    # No blob passes a radius limit below the tip radius, so Hough decides
+    detection = he.momentsDetector(img, maxRadius=10)
+    assert len(calls) == 1
+    assert detection == he.houghDetector(img)
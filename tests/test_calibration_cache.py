@@ -0,0 +1,56 @@
+import functools
+
+import cv2
+import numpy as np
+
+import CalibrationCache
+import HandEyeCalLogic as he
+
+
+def writeImage(path, value):
+    cv2.imwrite(str(path), np.full((8, 8, 3), value, np.uint8))
+    return str(path)
+
+
+def test_result_cache_round_trip(tmp_path):
+    fname = writeImage(tmp_path / "a.png", 10)
+    cache = CalibrationCache.ResultCache(str(tmp_path / "cache.json"))
+    key = cache.key(fname, {"detector": "hough", "intMtx": np.eye(3)})
+    assert cache.get(key) is None
+    cache.put(key, {"radius": 3.0})
+    cache.save()
+
+    reloaded = CalibrationCache.ResultCache(str(tmp_path / "cache.json"))
+    assert reloaded.get(key) == {"radius": 3.0}
+    assert (reloaded.hits, reloaded.misses) == (1, 0)
+
+
+def test_result_cache_key_depends_on_content_and_params(tmp_path):
+    fname = writeImage(tmp_path / "a.png", 10)
+    cache = CalibrationCache.ResultCache(str(tmp_path / "cache.json"))
+    key = cache.key(fname, {"intMtx": np.eye(3)})
+    assert cache.key(fname, {"intMtx": 2 * np.eye(3)}) != key
+    writeImage(tmp_path / "a.png", 20)
+    assert cache.key(fname, {"intMtx": np.eye(3)}) != key
+
+
+def test_result_cache_evicts_least_recently_used(tmp_path):
+    cache = CalibrationCache.ResultCache(str(tmp_path / "cache.json"), maxEntries=2)
+    cache.put("a", {})
+    cache.put("b", {})
+    cache.get("a")
+    cache.put("c", {})
+    assert list(cache.entries) == ["a", "c"]
+
+
+def test_detector_key_includes_partial_arguments():
+    loose = functools.partial(he.momentsDetector, minArea=10)
+    strict = functools.partial(he.momentsDetector, minArea=200)
+    assert he.detectorKey("hough") == "hough"
+    assert he.detectorKey(he.houghDetector) == he.detectorKey("hough")
+    assert he.detectorKey(he.momentsDetector) == "moments"
+    assert he.detectorKey(functools.partial(he.houghDetector)) == "hough(*(), **[])"
+    assert he.detectorKey(he.greenTipMask) == "HandEyeCalLogic.greenTipMask"
+    assert he.detectorKey(loose) != he.detectorKey(strict)
+    assert he.detectorKey(lambda img, colour: None) is None
+    assert he.detectorKey(functools.partial(lambda img, colour, k: None, k=1)) is None
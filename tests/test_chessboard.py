@@ -0,0 +1,91 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+import HandEyeCalLogic as he
+
+CRITERIA = (cv2.TERM_CRITERIA_EPS + cv2.TERM_CRITERIA_MAX_ITER, 30, 0.001)
+
+
+@pytest.fixture(scope="module")
+def board(tmp_path_factory):
+    """Rendered 10x7-square board (9x6 inner corners) and its true corner locations"""
+    square, ox, oy = 160, 300, 200
+    img = np.full((7 * square + 400, 10 * square + 600), 255, np.uint8)
+    for r in range(7):
+        for c in range(10):
+            if (r + c) % 2 == 0:
+                img[oy + r * square:oy + (r + 1) * square, ox + c * square:ox + (c + 1) * square] = 0
+    img = cv2.GaussianBlur(img, (0, 0), 2)
+    fname = str(tmp_path_factory.mktemp("board") / "board.png")
+    cv2.imwrite(fname, img)
+    corners = np.array([[ox + (i + 1) * square - 0.5, oy + (j + 1) * square - 0.5] for j in range(6) for i in range(9)])
+    return fname, corners
+
+
+@pytest.mark.parametrize("coarseLevels", [0, 1, 2, None])
+def test_coarse_search_finds_true_corners(board, coarseLevels):
+    fname, expected = board
+    corners, imageSize = he.findChessboard(fname, CRITERIA, coarseLevels=coarseLevels)
+    assert imageSize == (2200, 1520)
+    corners = corners.reshape(-1, 2)
+    if np.linalg.norm(corners[0] - expected[0]) > np.linalg.norm(corners[0] - expected[-1]):
+        corners = corners[::-1]
+    assert np.abs(corners - expected).max() < 0.05
+
+
+@pytest.fixture(scope="module")
+def chessboardFiles():
+    folder = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "sample_chessboard_images")
+    return sorted(os.path.join(folder, f) for f in os.listdir(folder) if f.endswith(".png"))
+
+
+def test_warm_start_only_for_matching_image_size(chessboardFiles):
+    intMtx, distCoeffs, info = he.distortionCalibration(chessboardFiles, returnInfo=True)
+    assert not info["warmStart"]
+
+    guess = intMtx.copy()
+    guess[:2, 2] += 5
+    result = he.distortionCalibration(chessboardFiles, intMtxGuess=guess, distCoeffsGuess=distCoeffs,
+                                      guessImageSize=info["imageSize"], returnInfo=True)
+    assert result[2]["warmStart"]
+    assert np.allclose(result[0], intMtx, atol=1.0)
+
+    w, h = info["imageSize"]
+    for guessImageSize in (None, (2 * w, 2 * h)):
+        result = he.distortionCalibration(chessboardFiles, intMtxGuess=2 * guess, distCoeffsGuess=distCoeffs,
+                                          guessImageSize=guessImageSize, returnInfo=True)
+        assert not result[2]["warmStart"]
+        assert np.allclose(result[0], intMtx)
+
+
+def test_view_selection_is_kept_only_if_no_less_accurate_on_all_views(chessboardFiles):
+    intMtx, distCoeffs, info = he.distortionCalibration(chessboardFiles, returnInfo=True)
+    assert info["views"] is None
+    objPts, imgPts = [], []
+    objp = np.zeros((9 * 6, 3), np.float32)
+    objp[:, :2] = np.mgrid[0:9, 0:6].T.reshape(-1, 2) * 23
+    for fname in chessboardFiles:
+        corners, imageSize = he.findChessboard(fname, CRITERIA)
+        if corners is not None:
+            objPts.append(objp)
+            imgPts.append(corners)
+    rmsFull = he.calibrationRms(objPts, imgPts, intMtx, distCoeffs)
+    assert np.isclose(rmsFull, info["rms"], rtol=1e-3)
+
+    for maxViews in (8, 18):
+        subsetMtx, subsetDist, subsetInfo = he.distortionCalibration(chessboardFiles, maxViews=maxViews,
+                                                                     returnInfo=True)
+        views = subsetInfo["views"]
+        assert len(views["selected"]) == maxViews and len(set(views["selected"])) == maxViews
+        assert 0 < views["coverage"] <= views["coverageAll"] <= 1
+        assert 0 < views["minAngle"] <= views["meanAngle"]
+
+        # Whatever is returned reprojects all views no worse than the calibration on all of them
+        assert he.calibrationRms(objPts, imgPts, subsetMtx, subsetDist) <= rmsFull * 1.01
+        # 8 views shift the principal point by some 11 px and fall back to all views, 18 are kept
+        assert views["accepted"] == (maxViews == 18)
+        if not views["accepted"]:
+            assert np.allclose(subsetMtx, intMtx) and np.allclose(subsetDist, distCoeffs)
@@ -0,0 +1,61 @@
+from RenderScheduler import RenderScheduler
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def makeScheduler(targetFps=10, tolerance=0.0):
+    clock = Clock()
+    renders = []
+    scheduler = RenderScheduler(lambda: renders.append(clock.now), targetFps, tolerance, clock=clock)
+    return scheduler, clock, renders
+
+
+def test_changes_within_an_interval_are_coalesced():
+    scheduler, clock, renders = makeScheduler(targetFps=10)
+    assert scheduler.request()
+    clock.now = 0.02
+    assert not scheduler.request()
+    clock.now = 0.05
+    assert not scheduler.request()
+    assert not scheduler.flush()
+    clock.now = 0.1
+    assert scheduler.flush()
+    assert renders == [0.0, 0.1]
+    assert (scheduler.rendered, scheduler.dropped) == (2, 1)
+    assert not scheduler.flush()
+
+
+def test_unchanged_state_is_skipped():
+    scheduler, clock, renders = makeScheduler(targetFps=10, tolerance=0.01)
+    scheduler.request((1.0, 2.0))
+    clock.now = 1.0
+    assert not scheduler.request((1.005, 2.0))
+    assert scheduler.request((1.5, 2.0))
+    assert renders == [0.0, 1.0]
+    assert scheduler.skipped == 1
+
+
+def test_timer_jitter_does_not_halve_the_rate():
+    scheduler, clock, renders = makeScheduler(targetFps=10)
+    for i in range(20):
+        clock.now = i * 0.1 - (0.005 if i % 2 else 0.0)
+        scheduler.request()
+    assert len(renders) == 20
+
+
+def test_force_renders_at_once_and_fps_counts_the_last_second():
+    scheduler, clock, renders = makeScheduler(targetFps=10)
+    scheduler.request()
+    scheduler.request()
+    assert scheduler.flush(force=True)
+    assert len(renders) == 2
+    clock.now = 0.5
+    assert scheduler.fps() == 2.0
+    clock.now = 2.0
+    assert scheduler.fps() == 0.0
@@ -0,0 +1,132 @@
+import numpy as np
+
+import Stats
+
+
+def test_robust_average_ignores_outliers():
+    rng = np.random.default_rng(0)
+    data = rng.normal([10.0, -5.0, 3.0], 0.1, (40, 3))
+    data[:4] += 50.0
+    average = Stats.robustAverage3D(data)
+    assert average.shape == (3,)
+    assert np.allclose(average, [10.0, -5.0, 3.0], atol=0.1)
+    assert np.linalg.norm(average - data.mean(axis=0)) > 4.0
+
+
+def test_robust_average_batch_matches_single_sets():
+    rng = np.random.default_rng(1)
+    data = rng.normal(0.0, 1.0, (2, 5, 30, 3))
+    data[..., :3, :] += 20.0
+    batch, iterations = Stats.robustAverage(data, returnIterations=True)
+    assert batch.shape == (2, 5, 3) and iterations.shape == (2, 5)
+    for i in range(2):
+        for j in range(5):
+            assert np.allclose(batch[i, j], Stats.robustAverage(data[i, j]), atol=1e-9)
+
+
+def test_robust_average_1d():
+    data = np.array([1.0, 1.1, 0.9, 1.05, 0.95, 30.0])
+    average = Stats.robustAverage1D(data)
+    assert np.ndim(average) == 0
+    assert abs(average - 1.0) < 0.05
+
+    # Identical samples average to themselves
+    assert Stats.robustAverage1D(np.full(8, 2.5)) == 2.5
+
+
+def rotations(rotvecs):
+    """Rotation matrices of rotation vectors (Rodrigues' formula)"""
+    rotvecs = np.atleast_2d(rotvecs)
+    angle = np.linalg.norm(rotvecs, axis=1)[:, None, None]
+    K = np.zeros((len(rotvecs), 3, 3))
+    K[:, 0, 1], K[:, 0, 2], K[:, 1, 2] = -rotvecs[:, 2], rotvecs[:, 1], -rotvecs[:, 0]
+    K -= np.swapaxes(K, 1, 2)
+    return np.eye(3) + np.sin(angle) / angle * K + (1 - np.cos(angle)) / angle ** 2 * (K @ K)
+
+
+def test_project_to_so3_gives_rotations():
+    M = np.random.default_rng(2).normal(size=(10, 3, 3))
+    R = Stats.projectToSO3(M)
+    assert np.allclose(R @ np.swapaxes(R, 1, 2), np.eye(3), atol=1e-12)
+    assert np.allclose(np.linalg.det(R), 1.0)
+
+
+def test_robust_rotation_average_ignores_outliers():
+    rng = np.random.default_rng(3)
+    truth = rotations(np.array([0.3, -0.2, 0.5]))[0]
+    noise = rotations(rng.normal(0.0, np.radians(0.5), (40, 3)))
+    samples = truth @ noise
+    samples[:4] = rotations(rng.normal(0.0, 1.0, (4, 3)))
+    mean = Stats.robustRotationAverage(samples)
+    assert np.allclose(mean @ mean.T, np.eye(3), atol=1e-12)
+    angle = np.degrees(np.arccos(np.clip((np.trace(mean @ truth.T) - 1) / 2, -1, 1)))
+    assert angle < 0.3
+
+
+def test_robust_rotation_average_batch():
+    rng = np.random.default_rng(4)
+    samples = rotations(rng.normal(0.0, 0.3, (2 * 20, 3))).reshape(2, 20, 3, 3)
+    batch, iterations = Stats.robustRotationAverage(samples, returnIterations=True)
+    assert batch.shape == (2, 3, 3) and iterations.shape == (2,)
+    for i in range(2):
+        assert np.allclose(batch[i], Stats.robustRotationAverage(samples[i]), atol=1e-9)
+
+
+def test_streaming_estimator_tracks_a_still_tool_and_rejects_outliers():
+    rng = np.random.default_rng(5)
+    estimator = Stats.StreamingRobustEstimator(3, window=40)
+    for i in range(200):
+        sample = rng.normal([100.0, 50.0, -20.0], 0.2)
+        if i % 10 == 5:
+            sample += 30.0
+        estimator.add(sample)
+    assert len(estimator) == 40
+    assert np.allclose(estimator.location, [100.0, 50.0, -20.0], atol=0.15)
+    assert estimator.add([130.0, 80.0, 10.0]) == 0.0
+
+
+def test_streaming_estimator_ignores_nan_and_follows_a_move():
+    rng = np.random.default_rng(6)
+    estimator = Stats.StreamingRobustEstimator(2, window=20)
+    for _ in range(50):
+        estimator.add(rng.normal([0.0, 0.0], 0.1))
+    assert estimator.add([np.nan, 1.0]) == 0.0
+
+    # After resetAfter rejected samples in a row the estimate restarts at the new position
+    for _ in range(estimator.resetAfter + 10):
+        estimator.add(rng.normal([25.0, -10.0], 0.1))
+    assert np.allclose(estimator.location, [25.0, -10.0], atol=0.2)
+
+
+def test_streaming_estimator_with_trend_follows_a_moving_tool_without_lag():
+    rng = np.random.default_rng(7)
+    plain = Stats.StreamingRobustEstimator(3, window=8, minScale=0.1)
+    trend = Stats.StreamingRobustEstimator(3, window=8, minScale=0.1, trend=True)
+    velocity = np.array([0.5, -0.25, 0.1])
+    plainErrs, trendErrs = [], []
+    for k in range(100):
+        position = k * velocity
+        sample = position + rng.normal(0.0, 0.1, 3)
+        plain.add(sample)
+        trend.add(sample)
+        if k >= 30:
+            plainErrs.append(np.linalg.norm(plain.location - position))
+            trendErrs.append(np.linalg.norm(trend.location - position))
+    # Without the trend the location lags some 7 frames (about 4 mm) behind
+    assert np.mean(plainErrs) > 5 * np.linalg.norm(velocity)
+    assert np.mean(trendErrs) < 0.25 * np.linalg.norm(velocity)
+    assert np.max(trendErrs) < np.linalg.norm(velocity)
+    assert np.allclose(trend.velocity, velocity, atol=0.05)
+
+
+def test_streaming_estimator_scale_floor_survives_identical_warm_up():
+    rng = np.random.default_rng(8)
+    collapsed = Stats.StreamingRobustEstimator(3, window=8)
+    floored = Stats.StreamingRobustEstimator(3, window=8, minScale=0.1)
+    for _ in range(5):
+        collapsed.add([10.0, 20.0, 30.0])
+        floored.add([10.0, 20.0, 30.0])
+    weights = [(collapsed.add(sample), floored.add(sample))
+               for sample in rng.normal([10.0, 20.0, 30.0], 0.1, (4, 3))]
+    assert all(c == 0.0 for c, f in weights)
+    assert all(f > 0.0 for c, f in weights)
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import numpy as np
+
+from TrackerAcquisition import TrackingBuffer, TrackerAcquisition
+
+
+def pose(x):
+    m = np.eye(4)
+    m[0, 3] = x
+    return m
+
+
+def writeFrame(buffer, i, hostTime, tracked=(True, True)):
+    tracking = [pose(i) if ok else np.full((4, 4), np.nan) for ok in tracked]
+    buffer.write([1, 2], [i, i], [i, i], tracking, [0.1, 0.1], hostTime=hostTime)
+
+
+def test_since_returns_new_frames_in_order():
+    buffer = TrackingBuffer(2, capacity=8)
+    for i in range(5):
+        writeFrame(buffer, i, float(i))
+    frames, count = buffer.since(0)
+    assert count == 5
+    assert np.array_equal(frames["hostTimes"], np.arange(5.0))
+    assert frames["matrices"].shape == (5, 2, 4, 4)
+
+    for i in range(5, 8):
+        writeFrame(buffer, i, float(i))
+    frames, count = buffer.since(count)
+    assert count == 8 and np.array_equal(frames["hostTimes"], [5.0, 6.0, 7.0])
+
+
+def test_ring_keeps_the_newest_capacity_frames():
+    buffer = TrackingBuffer(2, capacity=4)
+    for i in range(10):
+        writeFrame(buffer, i, float(i))
+    assert np.array_equal(buffer.since(0)[0]["hostTimes"], [6.0, 7.0, 8.0, 9.0])
+    assert np.array_equal(buffer.latest(2)["hostTimes"], [8.0, 9.0])
+    assert np.isclose(buffer.rate(), 1.0)
+
+
+def test_ports_missing_from_a_frame_are_not_left_over_from_older_frames():
+    buffer = TrackingBuffer(2, capacity=4)
+    for i in range(4):
+        writeFrame(buffer, i, float(i))
+    # A frame reporting only the first port overwrites the oldest slot
+    buffer.write([1], [4], [4], [pose(4)], [0.1], hostTime=4.0)
+    latest = buffer.latest()
+    assert np.array_equal(latest["matrices"][0, 0], pose(4))
+    assert np.isnan(latest["matrices"][0, 1]).all() and np.isnan(latest["quality"][0, 1])
+    assert latest["frameNumbers"][0, 1] == 0
+    assert len(buffer.around(4.0, 4, ports=[1])[0]["hostTimes"]) == 3
+
+
+def test_around_brackets_a_time_with_tracked_frames():
+    buffer = TrackingBuffer(2, capacity=32)
+    for i in range(20):
+        writeFrame(buffer, i, i * 0.01, tracked=(True, i != 10))
+    frames, numAfter = buffer.around(0.1, 4, ports=[0, 1])
+    assert np.allclose(frames["hostTimes"], [0.08, 0.09, 0.11, 0.12])
+    assert numAfter == 9
+
+    frames, numAfter = buffer.around(0.1, 3, ports=[0])
+    assert np.allclose(frames["hostTimes"], [0.09, 0.1, 0.11])
+
+
+def test_around_skips_frames_beyond_the_maximum_gap():
+    buffer = TrackingBuffer(2, capacity=64)
+    # The tracker stalls for two seconds after 0.19 s
+    for i in range(20):
+        writeFrame(buffer, i, i * 0.01)
+    for i in range(20, 30):
+        writeFrame(buffer, i, 2.0 + i * 0.01)
+
+    frames, numAfter = buffer.around(0.5, 4)
+    assert len(frames["hostTimes"]) == 4
+    frames, numAfter = buffer.around(0.5, 4, maxGap=0.05)
+    assert len(frames["hostTimes"]) == 0 and numAfter == 0
+
+    # Only the frames before the stall are near a video frame grabbed just after it
+    frames, numAfter = buffer.around(0.2, 8, maxGap=0.055)
+    assert np.allclose(frames["hostTimes"], [0.15, 0.16, 0.17, 0.18, 0.19])
+    assert numAfter == 0
+
+
+class FakeTracker:
+    """Stands in for an NDITracker, producing a new frame every third poll"""
+    def __init__(self):
+        self.polls = 0
+        self.tracking = False
+
+    def start_tracking(self):
+        self.tracking = True
+
+    def stop_tracking(self):
+        self.tracking = False
+
+    def get_frame(self):
+        self.polls += 1
+        n = self.polls // 3
+        return [1, 2], [n, n], [n, n], [pose(n), pose(-n)], [0.1, 0.1]
+
+
+def test_acquisition_writes_each_frame_once():
+    tracker = FakeTracker()
+    acquisition = TrackerAcquisition(tracker, 2, idleSleep=0.0005)
+    acquisition.start()
+    assert tracker.tracking
+    deadline = time.monotonic() + 2.0
+    while acquisition.buffer.count < 20 and time.monotonic() < deadline:
+        time.sleep(0.001)
+    acquisition.stop()
+    assert not tracker.tracking and not acquisition.isRunning()
+
+    frames = acquisition.buffer.since(0)[0]
+    assert len(frames["frameNumbers"]) >= 20
+    assert np.all(np.diff(frames["frameNumbers"][:, 0]) == 1)
+    assert all(t.name != "TrackerAcquisition" for t in threading.enumerate())
+
+
+def test_acquisition_failure_is_kept_for_the_reader():
+    tracker = FakeTracker()
+    tracker.get_frame = lambda: (_ for _ in ()).throw(IOError("serial port closed"))
+    acquisition = TrackerAcquisition(tracker, 2)
+    acquisition.start()
+    acquisition.thread.join(timeout=2.0)
+    assert not acquisition.isRunning()
+    assert isinstance(acquisition.error, IOError)
+    acquisition.stop()
@@ -0,0 +1,62 @@
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+import Undistortion
+
+A = np.array([[600.0, 0.0, 330.0], [0.0, 600.0, 235.0], [0.0, 0.0, 1.0]])
+DIST = np.array([[-0.2, 0.05, 0.001, -0.001, 0.0]])
+SIZE = (640, 480)
+
+
+@pytest.fixture(autouse=True)
+def emptyCache():
+    with Undistortion._lock:
+        Undistortion._maps.clear()
+        Undistortion._saved.clear()
+        Undistortion._keyLocks.clear()
+    yield
+
+
+def test_maps_match_cv2_undistort():
+    img = np.random.default_rng(0).integers(0, 255, (SIZE[1], SIZE[0], 3), dtype=np.uint8)
+    undistorted, newCameraMtx = Undistortion.undistortImage(img, A, DIST)
+    expected = cv2.undistort(img, A, DIST, None, newCameraMtx)
+    assert np.mean(np.abs(undistorted.astype(int) - expected.astype(int))) < 2.0
+
+
+def test_memory_hit_is_persisted_to_cache_dir(tmp_path):
+    maps = Undistortion.getUndistortMaps(A, DIST, SIZE)
+    assert not any(f.startswith("undistort_") for f in os.listdir(tmp_path))
+
+    assert Undistortion.getUndistortMaps(A, DIST, SIZE, cacheDir=str(tmp_path)) is maps
+    files = [f for f in os.listdir(tmp_path) if f.startswith("undistort_")]
+    assert len(files) == 1
+
+    # A restart loads the persisted tables
+    with Undistortion._lock:
+        Undistortion._maps.clear()
+    loaded = Undistortion.getUndistortMaps(A, DIST, SIZE, cacheDir=str(tmp_path))
+    for a, b in zip(loaded, maps):
+        assert np.array_equal(a, b)
+
+
+def test_concurrent_callers_share_one_build():
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(Undistortion.getUndistortMaps(A, DIST, SIZE)))
+               for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(r is results[0] for r in results)
+
+
+def test_key_locks_are_evicted_with_their_maps():
+    for i in range(Undistortion.MAX_CACHED_MAPS + 5):
+        Undistortion.getUndistortMaps(A + [[i, 0, 0], [0, 0, 0], [0, 0, 0]], DIST, (64, 48))
+    assert len(Undistortion._maps) == Undistortion.MAX_CACHED_MAPS
+    assert set(Undistortion._keyLocks) == set(Undistortion._maps)
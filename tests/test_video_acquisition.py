@@ -0,0 +1,71 @@
+import threading
+import time
+
+import numpy as np
+
+from VideoAcquisition import LatestFrameBuffer, VideoAcquisition
+
+
+def writeFrame(buffer, value, timestamp):
+    idx, slot = buffer.writeSlot((2, 2), np.uint8)
+    slot[:] = value
+    buffer.publish(idx, timestamp)
+
+
+def test_latest_frame_buffer_hands_out_only_the_newest_frame():
+    buffer = LatestFrameBuffer()
+    assert buffer.take() == (None, None)
+    writeFrame(buffer, 1, 1.0)
+    writeFrame(buffer, 2, 2.0)
+    writeFrame(buffer, 3, 3.0)
+    frame, timestamp = buffer.take()
+    assert timestamp == 3.0 and np.all(frame == 3)
+    assert buffer.dropped == 2
+    assert buffer.take() == (None, None)
+
+
+def test_latest_frame_buffer_never_overwrites_the_frame_being_read():
+    buffer = LatestFrameBuffer()
+    writeFrame(buffer, 1, 1.0)
+    frame, timestamp = buffer.take()
+    for value in range(2, 10):
+        writeFrame(buffer, value, float(value))
+    assert np.all(frame == 1)
+    assert buffer.take()[1] == 9.0
+
+
+class SlowSource:
+    """Stands in for a cv2.VideoCapture whose read blocks until the next frame"""
+    def __init__(self):
+        self.reading = False
+        self.reads = 0
+
+    def read(self, image=None):
+        self.reading = True
+        time.sleep(0.01)
+        self.reads += 1
+        self.reading = False
+        return True, np.full((4, 6, 3), self.reads, np.uint8)
+
+    def set(self, prop, value):
+        return True
+
+
+def test_video_acquisition_delivers_frames_and_joins_on_stop():
+    source = SlowSource()
+    acquisition = VideoAcquisition(source)
+    acquisition.start()
+    deadline = time.monotonic() + 2.0
+    frame = None
+    while frame is None and time.monotonic() < deadline:
+        frame, timestamp = acquisition.latestFrame()
+        time.sleep(0.005)
+    assert frame is not None and frame.shape == (4, 6, 3)
+
+    acquisition.stop()
+    assert not acquisition.isRunning()
+    assert not source.reading
+    reads = source.reads
+    time.sleep(0.05)
+    assert source.reads == reads
+    assert all(t.name != "VideoAcquisition" for t in threading.enumerate())